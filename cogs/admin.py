@@ -1,6 +1,9 @@
 import discord
 from discord.ext import commands
 from utils.mongodb import db
+from utils.startup import startup, StartupPending
+from utils.metrics import loop_lag
+from utils.profiler import profiler
 import time
 
 # Permission check helper
@@ -29,29 +32,110 @@ class AdminCommands(commands.Cog):
         total_users = sum(g.member_count for g in self.bot.guilds)
         embed.add_field(name="👥 Total Users", value=str(total_users), inline=True)
 
-        # Database connectivity
-        try:
-            # MongoDB connection is already established globally
-            embed.add_field(name="📊 Database", value="Connected", inline=True)
-        except Exception:
-            embed.add_field(name="📊 Database", value="Error", inline=True)
+        # Proxy dispatcher queue depth
+        proxy_cog = self.bot.get_cog("ProxyCommands")
+        if proxy_cog:
+            q = proxy_cog.queue_stats()
+            embed.add_field(
+                name="📨 Proxy Queue",
+                value=f"{q['in_flight']}/{q['max_concurrency']} in flight • {q['queued']} queued (peak {q['max_queue_depth']})",
+                inline=True
+            )
+
+            w = proxy_cog.webhook_stats()
+            hot = sorted(w["buckets"].items(), key=lambda kv: kv[1]["rate_limited"], reverse=True)[:3]
+            hot_text = "".join(f"\n`{wid}`: {b['rate_limited']} × 429 / {b['sends']} sends" for wid, b in hot if b["rate_limited"])
+            embed.add_field(
+                name="🪝 Webhooks",
+                value=f"{w['cached']} across {w['channels']} channels (pool ≤ {w['pool_size']}) • {w['rate_limited']} × 429{hot_text}",
+                inline=False
+            )
+
+        # Startup stages: when each became ready, in seconds since launch
+        stages = [
+            f"{stage} {t['ready_at']:.1f}s" if t["ready_at"] is not None else f"{stage} ⏳"
+            for stage, t in startup.timings().items()
+        ]
+        if stages:
+            embed.add_field(name="🚀 Startup", value=" • ".join(stages), inline=False)
+
+        # Database connectivity: an actual round trip, not just "a client exists"
+        ping = await db.ping()
+        embed.add_field(
+            name="📊 Database",
+            value=f"Connected ({ping:.2f}ms)" if ping is not None else ("Unreachable" if db.db is not None else "Not connected"),
+            inline=True
+        )
+        embed.add_field(
+            name="⏱️ Event Loop Lag",
+            value=f"{loop_lag.last * 1000:.1f}ms (worst {loop_lag.worst * 1000:.1f}ms)",
+            inline=True
+        )
 
         embed.set_footer(text=f"Requested by {ctx.author.display_name}")
         await msg.edit(content=None, embed=embed)
 
+    @commands.command(name="pixel_profile")
+    @commands.check(is_admin)
+    async def pixel_profile(self, ctx, action: str = None):
+        """Show the loop profiler report, or turn it `on`/`off`/`reset` it (bot owner only)."""
+        if action:
+            if not await self.bot.is_owner(ctx.author):
+                return await ctx.send("❌ Only the bot owner can change the profiler.")
+            action = action.lower()
+            if action == "on":
+                profiler.enable()
+            elif action == "off":
+                profiler.disable()
+            elif action == "reset":
+                profiler.reset()
+            else:
+                return await ctx.send("❌ Usage: `!pixel_profile [on|off|reset]`")
+            return await ctx.send(f"✅ Profiler {'enabled' if profiler.enabled else 'disabled'}.")
+
+        embed = discord.Embed(title="🔬 Loop Profiler", color=0x8A2BE2)
+        embed.add_field(name="Status", value="On" if profiler.enabled else "Off (`!pixel_profile on`)", inline=True)
+        embed.add_field(
+            name="⏱️ Event Loop Lag",
+            value=f"{loop_lag.last * 1000:.1f}ms (worst {loop_lag.worst * 1000:.1f}ms)",
+            inline=True
+        )
+        top = profiler.top(8)
+        embed.add_field(
+            name="🧱 Handlers by time blocking the loop",
+            value="\n".join(
+                f"`{h['handler']}` {h['blocking_ms']:.0f}ms blocking / {h['wall_ms']:.0f}ms wall "
+                f"× {h['calls']} (worst step {h['max_step_ms']:.0f}ms)"
+                for h in top
+            ) or "No handlers recorded yet.",
+            inline=False
+        )
+        stalls = profiler.recent_stalls()[:3]
+        for stall in stalls:
+            # The innermost frames are the ones holding the loop
+            stack = "".join(stall["stack"][-3:])[-900:]
+            took = f"{stall['duration_ms']:.0f}ms" if stall["duration_ms"] is not None else "ongoing"
+            embed.add_field(
+                name=f"🐢 Stall {took} in {stall['handler'] or 'unknown handler'}",
+                value=f"```{stack}```",
+                inline=False
+            )
+        embed.set_footer(text="Full report: GET /debug/profile (served when PROFILE_TOKEN is set)")
+        await ctx.send(embed=embed)
+
     @commands.command(name="blacklist_channel")
     @commands.check(is_admin)
     async def blacklist_channel(self, ctx, channel: discord.TextChannel):
         """Add a channel to the blacklist (admin only)."""
         guild_id = str(ctx.guild.id)
-        entry = db.get_blacklist(guild_id) or {"guild_id": guild_id, "channels": [], "categories": []}
+        entry = await db.get_blacklist(guild_id) or {"guild_id": guild_id, "channels": [], "categories": []}
         
         if channel.id in entry["channels"]:
             await ctx.send(f"❌ {channel.mention} is already blacklisted.")
             return
         
         entry["channels"].append(channel.id)
-        db.save_blacklist(guild_id, entry)
+        await db.save_blacklist(guild_id, entry)
         await ctx.send(f"✅ Added {channel.mention} to the blacklist.")
 
     @commands.command(name="blacklist_category")
@@ -59,14 +143,14 @@ class AdminCommands(commands.Cog):
     async def blacklist_category(self, ctx, category: discord.CategoryChannel):
         """Add a category to the blacklist (admin only)."""
         guild_id = str(ctx.guild.id)
-        entry = db.get_blacklist(guild_id) or {"guild_id": guild_id, "channels": [], "categories": []}
+        entry = await db.get_blacklist(guild_id) or {"guild_id": guild_id, "channels": [], "categories": []}
         
         if category.id in entry["categories"]:
             await ctx.send(f"❌ Category **{category.name}** is already blacklisted.")
             return
         
         entry["categories"].append(category.id)
-        db.save_blacklist(guild_id, entry)
+        await db.save_blacklist(guild_id, entry)
         await ctx.send(f"✅ Added category **{category.name}** to the blacklist.")
 
     @commands.command(name="list_blacklists")
@@ -74,7 +158,7 @@ class AdminCommands(commands.Cog):
     async def list_blacklists(self, ctx):
         """List all blacklisted channels and categories (admin only)."""
         guild_id = str(ctx.guild.id)
-        entry = db.get_blacklist(guild_id) or {"channels": [], "categories": []}
+        entry = await db.get_blacklist(guild_id) or {"channels": [], "categories": []}
         
         embed = discord.Embed(title="📋 Blacklist Status", color=0x8A2BE2)
         
@@ -112,7 +196,7 @@ class AdminCommands(commands.Cog):
         )
         embed.add_field(
             name="🛠️ Utility",
-            value="`!pixel` - Bot status & latency\n`!admin_commands` - This menu",
+            value="`!pixel` - Bot status & latency\n`!pixel_profile [on|off|reset]` - Loop profiler\n`!admin_commands` - This menu",
             inline=False
         )
         embed.set_footer(text="Requires Administrator permissions.")
@@ -120,11 +204,14 @@ class AdminCommands(commands.Cog):
 
     # Global error handler for admin commands
     @pixel_status.error
+    @pixel_profile.error
     @blacklist_channel.error
     @blacklist_category.error
     @list_blacklists.error
     @admin_commands.error
     async def admin_error(self, ctx, error):
+        if isinstance(error, StartupPending):
+            return  # reported by the global handler
         if isinstance(error, commands.CheckFailure):
             await ctx.send("❌ You need Administrator permissions to use this.")
         else:
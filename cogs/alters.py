@@ -5,7 +5,7 @@ import uuid
 from datetime import datetime
 
 from utils.mongodb import db
-from utils.helpers import find_alter_by_name, create_embed
+from utils.helpers import create_embed
 
 class AlterCommands(commands.Cog):
     def __init__(self, bot):
@@ -16,14 +16,8 @@ class AlterCommands(commands.Cog):
         """Create a new alter profile."""
         user_id = str(ctx.author.id)
 
-        # Load or initialize profile
-        profile = db.get_profile(user_id) or {"user_id": user_id, "system": {}, "alters": {}, "folders": {}}
-
-        if name in profile["alters"]:
-            return await ctx.send(f"❌ An alter named **{name}** already exists.")
-
         alter_id = str(uuid.uuid4())[:8]
-        profile["alters"][name] = {
+        created = await db.set_alter(user_id, name, {
             "alter_id": alter_id,
             "displayname": name,
             "pronouns": pronouns,
@@ -35,8 +29,9 @@ class AlterCommands(commands.Cog):
             "aliases": [],
             "color": None,
             "created_date": datetime.utcnow().isoformat()
-        }
-        db.save_profile(user_id, profile)
+        }, overwrite=False)
+        if not created:
+            return await ctx.send(f"❌ An alter named **{name}** already exists.")
 
         embed = create_embed(
             title="✅ Alter Created Successfully",
@@ -52,15 +47,10 @@ class AlterCommands(commands.Cog):
     async def show_alter(self, ctx, *, query: str):
         """Display an alter's details."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
-        if not profile or not profile.get("alters"):
-            return await ctx.send("❌ You have no alters. Use `!create <name>` to add one.")
-
-        actual = find_alter_by_name(profile, query)
-        if not actual:
+        found = await db.find_alter(user_id, query)
+        if not found:
             return await ctx.send(f"❌ Alter '{query}' not found.")
-
-        data = profile["alters"][actual]
+        actual, data = found
         color = int(data.get('color', '0x8A2BE2').lstrip('#'), 16) if data.get('color') else 0x8A2BE2
 
         embed = discord.Embed(title=f"👤 {data.get('displayname', actual)}", color=color)
@@ -89,7 +79,7 @@ class AlterCommands(commands.Cog):
     async def list_profiles(self, ctx):
         """Paginated list of all alters."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id)
         alters = profile.get('alters', {}) if profile else {}
         if not alters:
             return await ctx.send("❌ No alters to list.")
@@ -139,12 +129,10 @@ class AlterCommands(commands.Cog):
     async def edit_alter(self, ctx, *, query: str):
         """Interactive edit of alter fields."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
-        if not profile:
-            return await ctx.send("❌ No alters to edit.")
-        actual = find_alter_by_name(profile, query)
-        if not actual:
+        found = await db.find_alter(user_id, query)
+        if not found:
             return await ctx.send(f"❌ Alter '{query}' not found.")
+        actual, _ = found
 
         options = ['🏷️','👤','📝','🖼️','🎨','🗨️','🌈','👥']
         actions = {'🏷️':'displayname','👤':'pronouns','📝':'description','🖼️':'avatar','🎨':'banner','🗨️':'proxy','🌈':'color','👥':'proxy_avatar'}
@@ -180,15 +168,13 @@ class AlterCommands(commands.Cog):
         def mcheck(m): return m.author.id==int(user_id) and m.channel==ctx.channel
         try:
             m = await self.bot.wait_for('message', timeout=60.0, check=mcheck)
-            profile = db.get_profile(user_id)
-            data = profile['alters'][alter]
             val = m.content.strip()
             if field=='color':
                 if not val.startswith('#'): val='#'+val
                 if len(val)!=7 or not all(c in '0123456789abcdefABCDEF' for c in val[1:]):
                     return await ctx.send("❌ Invalid hex color.")
-            data[field] = val
-            db.save_profile(user_id, profile)
+            if not await db.update_alter_field(user_id, alter, field, val):
+                return await ctx.send(f"❌ Alter '{alter}' no longer exists.")
             await ctx.send(f"✅ {field.title()} updated.")
         except asyncio.TimeoutError:
             await ctx.send("⏰ Update timed out.")
@@ -197,12 +183,10 @@ class AlterCommands(commands.Cog):
     async def delete_alter(self, ctx, *, query: str):
         """Delete an alter permanently."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
-        if not profile:
-            return await ctx.send("❌ No alters to delete.")
-        actual = find_alter_by_name(profile, query)
-        if not actual:
+        found = await db.find_alter(user_id, query)
+        if not found:
             return await ctx.send(f"❌ Alter '{query}' not found.")
+        actual, _ = found
 
         embed = create_embed(
             title="⚠️ Delete Alter",
@@ -214,8 +198,7 @@ class AlterCommands(commands.Cog):
         try:
             r,_ = await self.bot.wait_for('reaction_add', timeout=60.0, check=c)
             if str(r.emoji)=='✅':
-                del profile['alters'][actual]
-                db.save_profile(user_id, profile)
+                await db.remove_alter(user_id, actual)
                 await ctx.send(f"✅ Alter **{actual}** deleted.")
             else:
                 await ctx.send("❌ Deletion cancelled.")
@@ -226,42 +209,37 @@ class AlterCommands(commands.Cog):
     async def add_alias(self, ctx, query: str, *, alias: str):
         """Add an alias to an alter."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
-        actual = find_alter_by_name(profile, query) if profile else None
-        if not actual:
+        found = await db.find_alter(user_id, query)
+        if not found:
             return await ctx.send(f"❌ Alter '{query}' not found.")
-        aliases = profile['alters'][actual].setdefault('aliases', [])
-        if alias in aliases:
+        actual, data = found
+        if alias in (data.get('aliases') or []):
             return await ctx.send(f"❌ Alias '{alias}' already exists.")
-        aliases.append(alias)
-        db.save_profile(user_id, profile)
+        await db.add_alias(user_id, actual, alias)
         await ctx.send(f"✅ Alias '{alias}' added to **{actual}**.")
 
     @commands.command(name="remove_alias")
     async def remove_alias(self, ctx, query: str, *, alias: str):
         """Remove an alias from an alter."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
-        actual = find_alter_by_name(profile, query) if profile else None
-        if not actual:
+        found = await db.find_alter(user_id, query)
+        if not found:
             return await ctx.send(f"❌ Alter '{query}' not found.")
-        aliases = profile['alters'][actual].get('aliases', [])
-        if alias not in aliases:
+        actual, data = found
+        if alias not in (data.get('aliases') or []):
             return await ctx.send(f"❌ Alias '{alias}' not found.")
-        aliases.remove(alias)
-        db.save_profile(user_id, profile)
+        await db.remove_alias(user_id, actual, alias)
         await ctx.send(f"✅ Alias '{alias}' removed from **{actual}**.")
 
     @commands.command(name="proxyavatar")
     async def set_proxy_avatar(self, ctx, query: str, *, url: str = None):
         """Set or clear a proxy avatar for an alter."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
-        actual = find_alter_by_name(profile, query) if profile else None
-        if not actual:
+        found = await db.find_alter(user_id, query)
+        if not found:
             return await ctx.send(f"❌ Alter '{query}' not found.")
-        profile['alters'][actual]['proxy_avatar'] = url.strip() if url else None
-        db.save_profile(user_id, profile)
+        actual, _ = found
+        await db.update_alter_field(user_id, actual, 'proxy_avatar', url.strip() if url else None)
         action = 'Set' if url else 'Cleared'
         await ctx.send(f"✅ {action} proxy avatar for **{actual}**.")
 
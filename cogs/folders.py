@@ -4,7 +4,7 @@ import asyncio
 from datetime import datetime
 
 from utils.mongodb import db
-from utils.helpers import find_alter_by_name, create_embed
+from utils.helpers import create_embed
 
 class FolderCommands(commands.Cog):
     def __init__(self, bot):
@@ -14,23 +14,16 @@ class FolderCommands(commands.Cog):
     async def create_folder(self, ctx, *, folder_name: str):
         """Create a new folder."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
-        # Initialize profile if empty
-        if not profile:
-            profile = {"user_id": user_id, "system": {}, "alters": {}, "folders": {}}
-
-        if folder_name in profile.get("folders", {}):
-            return await ctx.send(f"❌ A folder named **{folder_name}** already exists.")
-
-        profile.setdefault("folders", {})[folder_name] = {
+        created = await db.set_folder(user_id, folder_name, {
             "name": folder_name,
             "description": None,
             "color": None,
             "banner": None,
             "icon": None,
             "alters": []
-        }
-        db.save_profile(user_id, profile)
+        }, overwrite=False)
+        if not created:
+            return await ctx.send(f"❌ A folder named **{folder_name}** already exists.")
 
         embed = create_embed(
             title="✅ Folder Created",
@@ -47,7 +40,7 @@ class FolderCommands(commands.Cog):
     async def edit_folder(self, ctx, *, folder_name: str):
         """Edit folder properties."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         folders = profile.get("folders", {})
         if folder_name not in folders:
             return await ctx.send(f"❌ Folder **{folder_name}** not found.")
@@ -84,26 +77,24 @@ class FolderCommands(commands.Cog):
         def mcheck(m): return m.author.id == int(user_id) and m.channel == ctx.channel
         try:
             msg = await self.bot.wait_for('message', timeout=60.0, check=mcheck)
-            profile = db.get_profile(user_id)
-            folders = profile.setdefault('folders', {})
-            fdata = folders.get(folder_name)
-            if not fdata:
+            profile = await db.get_profile(user_id, with_alters=False) or {}
+            folders = profile.get('folders', {})
+            if folder_name not in folders:
                 return await ctx.send("❌ Folder not found.")
             if field == 'name':
                 new_name = msg.content.strip()
                 if new_name != folder_name and new_name in folders:
                     return await ctx.send(f"❌ Folder **{new_name}** already exists.")
                 # rename
-                folders[new_name] = folders.pop(folder_name)
-                folders[new_name]['name'] = new_name
+                if new_name != folder_name:
+                    await db.rename_folder(user_id, folder_name, new_name)
             elif field == 'color':
                 val = msg.content.strip()
                 if not val.startswith('#') or len(val) != 7:
                     return await ctx.send("❌ Invalid hex color.")
-                fdata['color'] = val
+                await db.update_folder_field(user_id, folder_name, 'color', val)
             else:
-                fdata[field] = msg.content.strip()
-            db.save_profile(user_id, profile)
+                await db.update_folder_field(user_id, folder_name, field, msg.content.strip())
             await ctx.send(f"✅ Folder {field} updated.")
         except asyncio.TimeoutError:
             await ctx.send("⏰ Update timed out.")
@@ -112,7 +103,7 @@ class FolderCommands(commands.Cog):
     async def delete_folder(self, ctx, *, folder_name: str):
         """Delete a folder."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         folders = profile.get('folders', {})
         if folder_name not in folders:
             return await ctx.send(f"❌ Folder **{folder_name}** not found.")
@@ -128,8 +119,7 @@ class FolderCommands(commands.Cog):
         try:
             r,_ = await self.bot.wait_for('reaction_add', timeout=60.0, check=check)
             if str(r.emoji)=='✅':
-                del folders[folder_name]
-                db.save_profile(user_id, profile)
+                await db.remove_folder(user_id, folder_name)
                 await ctx.send(f"✅ Folder **{folder_name}** deleted.")
             else:
                 await ctx.send("❌ Deletion cancelled.")
@@ -140,7 +130,7 @@ class FolderCommands(commands.Cog):
     async def show_folder(self, ctx, *, folder_name: str):
         """Display folder details."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         folder = profile.get('folders', {}).get(folder_name)
         if not folder:
             return await ctx.send(f"❌ Folder **{folder_name}** not found.")
@@ -157,7 +147,8 @@ class FolderCommands(commands.Cog):
             embed.set_image(url=folder['banner'])
         alters = folder.get('alters', [])
         if alters:
-            displays = [profile['alters'][n].get('displayname',n) for n in alters if n in profile.get('alters',{})]
+            members = await db.get_alters(user_id, alters)
+            displays = [members[n].get('displayname',n) for n in alters if n in members]
             embed.add_field(name=f"👥 Alters ({len(displays)})", value="\n".join(displays), inline=False)
         await ctx.send(embed=embed)
 
@@ -165,14 +156,16 @@ class FolderCommands(commands.Cog):
     async def add_alters(self, ctx, folder_name: str, *, names: str):
         """Add alters to a folder."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         folder = profile.get('folders', {}).get(folder_name)
         if not folder:
             return await ctx.send(f"❌ Folder **{folder_name}** not found.")
         to_add = [n.strip() for n in names.split(',')]
         added, skipped, notfound = [], [], []
+        matches = await db.find_alters(user_id, to_add)
         for n in to_add:
-            actual = find_alter_by_name(profile, n)
+            found = matches.get(n)
+            actual = found[0] if found else None
             if not actual:
                 notfound.append(n)
             elif actual in folder['alters']:
@@ -181,7 +174,7 @@ class FolderCommands(commands.Cog):
                 folder['alters'].append(actual)
                 added.append(actual)
         if added:
-            db.save_profile(user_id, profile)
+            await db.add_folder_members(user_id, folder_name, added)
         embed = create_embed(title=f"📁 {folder_name} Update")
         if added: embed.add_field(name="✅ Added", value="\n".join(added), inline=False)
         if skipped: embed.add_field(name="⏭️ Skipped", value="\n".join(skipped), inline=False)
@@ -192,14 +185,16 @@ class FolderCommands(commands.Cog):
     async def remove_alters(self, ctx, folder_name: str, *, names: str):
         """Remove alters from a folder."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         folder = profile.get('folders', {}).get(folder_name)
         if not folder:
             return await ctx.send(f"❌ Folder **{folder_name}** not found.")
         to_remove = [n.strip() for n in names.split(',')]
         removed, notin, notfound = [], [], []
+        matches = await db.find_alters(user_id, to_remove)
         for n in to_remove:
-            actual = find_alter_by_name(profile, n)
+            found = matches.get(n)
+            actual = found[0] if found else None
             if not actual:
                 notfound.append(n)
             elif actual not in folder['alters']:
@@ -208,7 +203,7 @@ class FolderCommands(commands.Cog):
                 folder['alters'].remove(actual)
                 removed.append(actual)
         if removed:
-            db.save_profile(user_id, profile)
+            await db.remove_folder_members(user_id, folder_name, removed)
         embed = create_embed(title=f"📁 {folder_name} Update")
         if removed: embed.add_field(name="✅ Removed", value="\n".join(removed), inline=False)
         if notin: embed.add_field(name="⏭️ Not In Folder", value="\n".join(notin), inline=False)
@@ -219,7 +214,7 @@ class FolderCommands(commands.Cog):
     async def wipe_folder_alters(self, ctx, *, folder_name: str):
         """Remove all alters from a folder."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         folder = profile.get('folders', {}).get(folder_name)
         if not folder:
             return await ctx.send(f"❌ Folder **{folder_name}** not found.")
@@ -236,8 +231,7 @@ class FolderCommands(commands.Cog):
         try:
             r,_ = await self.bot.wait_for('reaction_add', timeout=60.0, check=c)
             if str(r.emoji)=='✅':
-                folder['alters'].clear()
-                db.save_profile(user_id, profile)
+                await db.clear_folder_members(user_id, folder_name)
                 await ctx.send(f"✅ Cleared all alters from **{folder_name}**.")
             else:
                 await ctx.send("❌ Cancelled.")
@@ -248,7 +242,7 @@ class FolderCommands(commands.Cog):
     async def list_folders(self, ctx):
         """List all folders."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         folders = profile.get('folders', {})
         if not folders:
             return await ctx.send("❌ No folders found. Use `!create_folder <name>`. ")
@@ -73,7 +73,10 @@ class HelpPaginator(commands.Cog):
         embed3.add_field(name="`!autoproxy latch`", value="Enable autoproxy latch mode.", inline=False)
         embed3.add_field(name="`!autoproxy front <name>`", value="Set autoproxy to a specific alter.", inline=False)
         embed3.add_field(name="`!autoproxy off`", value="Disable autoproxy.", inline=False)
-        embed3.add_field(name="`!edit <message_link> <new_content>`", value="Edit a recently proxied message.", inline=False)
+        embed3.add_field(name="`!edit_proxy [message_link] <new_content>`", value="Edit a proxied message (reply to it, link it, or default to your last one here).", inline=False)
+        embed3.add_field(name="`!delete_proxy [message_link]`", value="Delete a proxied message. Reacting ❌ to your own proxied message also deletes it.", inline=False)
+        embed3.add_field(name="`!reproxy <name> [message_link]`", value="Re-send a proxied message as another alter.", inline=False)
+        embed3.add_field(name="`!last_proxy [message_link]`", value="Show which alter sent your last proxied message here.", inline=False)
         embeds.append(embed3)
 
         # Page 4: Import and Export
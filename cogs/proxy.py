@@ -1,41 +1,150 @@
 import discord
 from discord.ext import commands
 from utils.mongodb import db
-from utils.helpers import find_alter_by_name, create_embed
+from utils.cache_sync import coherence
+from utils.blacklist import blacklist_cache
+from utils.helpers import create_embed
+from utils.dispatch import OrderedDispatcher
+from utils.proxy_matcher import ProxyMatcher, MatcherCache, NO_PROFILE, parse_proxy_pattern, extract_message_content
+from utils.attachments import ByteBudget, split_oversized, stream_webhook_send
+from utils.message_store import ProxiedMessage, ProxiedMessageStore
+from utils.startup import startup
+from utils.webhook_registry import WebhookRegistry
+from utils.metrics import metrics, record_cache
 import aiohttp
 import re
-import asyncio
+import time
 import logging
 from typing import Optional, Tuple, Dict, List, Any
-from datetime import datetime, timedelta
-import io
+import os
 
 logger = logging.getLogger(__name__)
 
+# Discord JSON error code returned when a webhook's token no longer works.
+INVALID_WEBHOOK_TOKEN = 50027
+# Discord JSON error code for a channel (or thread) that no longer exists.
+UNKNOWN_CHANNEL = 10003
+# A message link, or a bare message id.
+MESSAGE_REF = re.compile(r"(?:https?://(?:\w+\.)?discord(?:app)?\.com/channels/\d+/\d+/)?(\d{15,21})")
+# Reacting with this to your own proxied message deletes it.
+DELETE_REACTION = "❌"
+
+PROXY_SECONDS = metrics.histogram(
+    "pixel_proxy_seconds", "Time from receiving a message to finishing with it, including queueing.", ["result"]
+)
+PROXY_STAGE_SECONDS = metrics.histogram("pixel_proxy_stage_seconds", "Time spent in each proxy stage.", ["stage"])
+PROXY_IN_FLIGHT = metrics.gauge("pixel_proxy_in_flight", "Messages being proxied right now.")
+PROXY_QUEUED = metrics.gauge("pixel_proxy_queued", "Messages waiting for a proxy slot or for earlier messages in their channel.")
+PROXY_ATTACHMENT_BYTES = metrics.gauge("pixel_proxy_attachment_bytes_in_flight", "Attachment bytes being re-uploaded.")
+# Totals only: a series per webhook would grow with every channel. Per-webhook counts are in !pixel.
+WEBHOOK_RATE_LIMITED = metrics.counter("pixel_webhook_rate_limited_total", "429 responses on webhook sends.")
+WEBHOOK_SENDS = metrics.counter("pixel_webhook_sends_total", "Webhook sends.")
+WEBHOOKS_CACHED = metrics.gauge("pixel_webhooks_cached", "Webhooks held by the registry.")
+MESSAGE_LOG_PENDING = metrics.gauge("pixel_proxied_messages_pending", "Proxied-message log entries not yet written.")
+# Divide reads/writes by messages for the per-message DB cost (see ProxyContext).
+PROXY_CONTEXT_MESSAGES = metrics.counter("pixel_proxy_context_messages_total", "Messages checked through a ProxyContext.")
+PROXY_DB_READS = metrics.counter("pixel_proxy_db_reads_total", "MongoDB reads made while proxying messages.")
+PROXY_DB_WRITES = metrics.counter("pixel_proxy_db_writes_total", "MongoDB writes queued while proxying messages.")
+
+class ProxyContext:
+    """Per-message view of the documents a proxy needs.
+
+    Each document is loaded at most once (and only when the cog's caches
+    miss), autoproxy updates are collected and handed to the db
+    write-behind buffer once by :meth:`commit`, and the DB reads/writes are
+    counted for metrics.
+    """
+
+    __slots__ = ("cog", "message", "user_id", "guild_id", "_matcher", "_autoproxy", "_autoproxy_changes", "reads", "writes")
+
+    def __init__(self, cog: "ProxyCommands", message: discord.Message):
+        self.cog = cog
+        self.message = message
+        self.user_id = str(message.author.id)
+        self.guild_id = str(message.guild.id)
+        self._matcher: Optional[ProxyMatcher] = None
+        self._autoproxy: Optional[Dict[str, Any]] = None
+        self._autoproxy_changes: Dict[str, Any] = {}
+        self.reads = 0
+        self.writes = 0
+
+    @property
+    def autoproxy_key(self) -> str:
+        return f"{self.user_id}_{self.guild_id}"
+
+    async def matcher(self) -> ProxyMatcher:
+        if self._matcher is None:
+            self._matcher = self.cog._matchers.get(self.user_id)
+            record_cache("proxy_matcher", self._matcher is not None)
+            if self._matcher is None:
+                self.reads += 1
+                self._matcher = await self.cog.get_matcher(self.user_id)
+        return self._matcher
+
+    async def autoproxy(self) -> Dict[str, Any]:
+        if self._autoproxy is None:
+            record_cache("autoproxy", self.cog._autoproxy_loaded)
+            if not self.cog._autoproxy_loaded:
+                self.reads += 1
+            self._autoproxy = dict(await self.cog._get_autoproxy(self.autoproxy_key))
+        return self._autoproxy
+
+    async def update_autoproxy(self, **fields):
+        (await self.autoproxy()).update(fields)
+        self._autoproxy_changes.update(fields)
+
+    async def commit(self):
+        """Queue buffered changes, once per document; the cache is updated immediately."""
+        if self._autoproxy_changes:
+            changes, self._autoproxy_changes = self._autoproxy_changes, {}
+            self.writes += 1
+            db.queue_autoproxy(self.autoproxy_key, changes)
+            self.cog.autoproxy_settings[self.autoproxy_key] = self._autoproxy
+
 class ProxyCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.proxy_cache: Dict[str, List[Dict[str, Any]]] = {}
         self.autoproxy_settings: Dict[str, Dict[str, Any]] = {}
-        self.message_map: Dict[str, int] = {}
         self._session: Optional[aiohttp.ClientSession] = None
-        self._webhook_cache: Dict[str, discord.Webhook] = {}
-        self._webhook_locks: Dict[str, asyncio.Lock] = {}
-        self._lock = asyncio.Lock()
-        self._webhook_cleanup_task: Optional[asyncio.Task] = None
-        self._last_webhook_cleanup = datetime.utcnow()
-        self._message_cache: Dict[int, Dict[str, Any]] = {}
+        self._dispatcher = OrderedDispatcher(int(os.getenv("PROXY_MAX_CONCURRENCY", 32)))
+        self._webhooks = WebhookRegistry(self.get_session, busy=lambda: self._dispatcher.in_flight > 0)
+        self._upload_budget = ByteBudget(int(os.getenv("PROXY_ATTACHMENT_BUDGET_MB", 64)) * 1024 * 1024)
+        self._message_cache = ProxiedMessageStore(
+            max_size=int(os.getenv("PROXY_MESSAGE_CACHE_SIZE", 10000)),
+            max_age=float(os.getenv("PROXY_MESSAGE_CACHE_AGE", 21600)),
+            persist=os.getenv("PROXY_MESSAGE_LOG", "true").lower() in ("1", "true", "yes"),
+        )
+        self._matchers = MatcherCache()
+        self._context_stats = {"messages": 0, "db_reads": 0, "db_writes": 0}
+        self._autoproxy_loaded = False
+        db.add_listener("profiles", self._on_profile_change)
+        coherence.subscribe("profiles", self._on_remote_profile)
+        coherence.subscribe("autoproxy", self._on_remote_autoproxy)
+        coherence.subscribe("webhooks", self._webhooks.apply_remote)
+        coherence.subscribe("alters", self._on_remote_alter)
+        metrics.add_collector(self._collect_metrics)
 
     async def get_session(self) -> aiohttp.ClientSession:
         if not self._session or self._session.closed:
-            self._session = aiohttp.ClientSession()
+            # Webhook responses feed the registry's per-webhook rate-limit buckets.
+            self._session = aiohttp.ClientSession(trace_configs=[self._webhooks.trace_config()])
         return self._session
 
-    def cog_unload(self):
+    async def cog_unload(self):
+        db.remove_listener("profiles", self._on_profile_change)
+        coherence.unsubscribe("profiles", self._on_remote_profile)
+        coherence.unsubscribe("autoproxy", self._on_remote_autoproxy)
+        coherence.unsubscribe("webhooks", self._webhooks.apply_remote)
+        coherence.unsubscribe("alters", self._on_remote_alter)
+        metrics.remove_collector(self._collect_metrics)
+        await self._webhooks.close()
+        await self._message_cache.close()
         if self._session and not self._session.closed:
-            asyncio.create_task(self._session.close())
-        if self._webhook_cleanup_task:
-            self._webhook_cleanup_task.cancel()
+            await self._session.close()
+
+    async def warm_up(self):
+        """Called by the bot in the background once MongoDB is connected."""
+        await self.initialize_cache()
 
     async def initialize_cache(self):
         try:
@@ -44,127 +153,200 @@ class ProxyCommands(commands.Cog):
                 logger.warning("⚠️ MongoDB collections not available - proxy cache initialization skipped")
                 return
                 
-            # Load all proxy tags
-            async for user_data in db.profiles.find({}):
-                user_id = user_data.get('user_id')
-                if not user_id:
-                    continue
-                proxies = []
-                for alter_name, alter_data in user_data.get('alters', {}).items():
-                    proxy_tag = alter_data.get('proxy')
-                    if proxy_tag:
-                        prefix, suffix = self.parse_proxy_pattern(proxy_tag)
-                        proxies.append({
-                            'name': alter_name,
-                            'prefix': prefix,
-                            'suffix': suffix,
-                            'display_name': alter_data.get('displayname', alter_name),
-                            'avatar': alter_data.get('proxy_avatar') or alter_data.get('avatar'),
-                            'proxy_tag': proxy_tag
-                        })
-                if proxies:
-                    self.proxy_cache[user_id] = proxies
-
-            # Load autoproxy settings
-            async for settings in db.autoproxy.find({}):
-                user_id = settings.get('user_id')
-                if user_id:
-                    self.autoproxy_settings[user_id] = settings
-
-            self._webhook_cleanup_task = asyncio.create_task(self._cleanup_webhooks_periodically())
+            # Proxy matchers are built lazily per author (see get_matcher).
+            await self._load_autoproxy()
+            await blacklist_cache.load_all()
+            await self._webhooks.preload(self.bot.get_guild)
             logger.info("✅ Proxy cache initialized successfully")
         except Exception as e:
             logger.error(f"❌ Failed to initialize proxy cache: {e}")
             logger.info("🔄 Proxy cog will continue without cache - features may be limited until database connection is restored")
 
-    async def _cleanup_webhooks_periodically(self):
-        try:
-            while True:
-                await asyncio.sleep(300)
-                now = datetime.utcnow()
-                for key, webhook in list(self._webhook_cache.items()):
-                    try:
-                        await webhook.fetch()
-                    except (discord.NotFound, discord.Forbidden):
-                        del self._webhook_cache[key]
-                        if key in self._webhook_locks:
-                            del self._webhook_locks[key]
-                self._last_webhook_cleanup = now
-        except asyncio.CancelledError:
-            pass
+    async def _load_autoproxy(self):
+        settings_by_key = {}
+        async for settings in db.autoproxy.find({}):
+            key = settings.get('user_id')
+            if key:
+                settings_by_key[key] = settings
+        self.autoproxy_settings = settings_by_key
+        self._autoproxy_loaded = True
+
+    # -- Cross-instance coherence (see utils/cache_sync.py) --------------------
+
+    def _on_remote_profile(self, user_id: Optional[str], doc: Optional[Dict[str, Any]]):
+        if user_id is None:
+            self._matchers.clear()
+            return
+        self._on_profile_change(user_id, doc)
+
+    async def _on_remote_autoproxy(self, key: Optional[str], doc: Optional[Dict[str, Any]]):
+        if key is None:
+            # Could not attribute the change; serve from the DB until reloaded.
+            self._autoproxy_loaded = False
+            try:
+                await self._load_autoproxy()
+            except Exception as e:
+                logger.error(f"❌ Failed to reload autoproxy settings: {e}")
+            return
+        if doc is None:
+            self.autoproxy_settings.pop(key, None)
+        else:
+            self.autoproxy_settings[key] = doc
+
+    def _on_remote_alter(self, user_id: Optional[str], doc: Optional[Dict[str, Any]]):
+        if user_id is None:
+            self._matchers.clear()
+            return
+        self._on_profile_change(user_id, {})
+
+    # -- Webhook registry events (see utils/webhook_registry.py) ---------------
+
+    @commands.Cog.listener()
+    async def on_webhooks_update(self, channel: discord.abc.GuildChannel):
+        if (channel.guild.id, channel.id) in self._webhooks:
+            self._webhooks.schedule(channel, force=True)
 
-    async def create_or_get_webhook(self, channel: discord.TextChannel) -> Optional[discord.Webhook]:
-        cache_key = f"{channel.guild.id}_{channel.id}"
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        key = (channel.guild.id, channel.id)
+        if key in self._webhooks:
+            await self._webhooks.evict(key)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        key = (after.guild.id, after.id)
+        if key in self._webhooks and not after.permissions_for(after.guild.me).view_channel:
+            self._webhooks.drop(key)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self._webhooks.drop_guild(guild.id)
+
+    @staticmethod
+    def _webhook_target(channel: discord.abc.Messageable) -> Tuple[Optional[discord.abc.GuildChannel], Optional[discord.Thread]]:
+        """Return (channel that owns the webhook, thread to post into) for ``channel``.
+
+        Threads and forum posts can't own webhooks; they share their parent
+        channel's, so the webhook count stays flat however many threads exist.
+        """
+        if isinstance(channel, discord.Thread):
+            return channel.parent, channel
+        return channel, None
+
+    async def create_or_get_webhook(self, channel: discord.abc.Messageable) -> Optional[discord.Webhook]:
+        parent, _ = self._webhook_target(channel)
+        if parent is None:
+            logger.warning(f"Parent of thread {channel.id} is not cached; cannot proxy there.")
+            return None
+        key = (parent.guild.id, parent.id)
         perms = channel.permissions_for(channel.guild.me)
-        if not (perms.manage_webhooks and perms.manage_messages):
+        if not (parent.permissions_for(parent.guild.me).manage_webhooks and perms.manage_messages):
             await channel.send("❌ Missing **Manage Webhooks** or **Manage Messages** permissions.")
             return None
 
-        if cache_key not in self._webhook_locks:
-            self._webhook_locks[cache_key] = asyncio.Lock()
+        # Trust the registry: a dead webhook is detected when send() fails (see _send_proxied).
+        webhook = self._webhooks.get(key)
+        record_cache("webhook", webhook is not None)
+        if webhook and not self._webhooks.wants_more(key):
+            return webhook
 
-        if key := self._webhook_cache.get(cache_key):
-            try:
-                await key.fetch()
-                return key
-            except discord.NotFound:
-                del self._webhook_cache[cache_key]
-
-        async with self._webhook_locks[cache_key]:
-            data = db.get_webhook(channel.id, channel.guild.id)
-            if data:
-                try:
-                    webhook = discord.Webhook.partial(data['webhook_id'], data['webhook_token'], session=await self.get_session())
-                    await webhook.fetch()
-                    self._webhook_cache[cache_key] = webhook
-                    return webhook
-                except discord.NotFound:
-                    db.delete_webhook(channel.id, channel.guild.id)
+        async with self._webhooks.lock(key):
+            webhook = self._webhooks.get(key) or await self._webhooks.load(key)
+            if webhook and not self._webhooks.wants_more(key):
+                return webhook
 
-            # Create new webhook
+            # Create a new webhook, or grow the channel's pool when every member is busy
             try:
-                webhook = await channel.create_webhook(name="PIXEL Proxy")
-                db.save_webhook(channel.id, channel.guild.id, webhook.id, webhook.token)
-                self._webhook_cache[cache_key] = webhook
-                return webhook
+                created = await parent.create_webhook(name="PIXEL Proxy")
+                if webhook is None:
+                    await db.save_webhook(parent.id, parent.guild.id, created.id, created.token)
+                else:
+                    await db.add_pool_webhook(parent.id, parent.guild.id, created.id, created.token)
+                return await self._webhooks.add(key, created.id, created.token)
             except discord.Forbidden:
+                if webhook is not None:
+                    self._webhooks.cap_pool(key)
+                    return webhook
                 await channel.send("❌ Cannot create webhook; missing permissions.")
                 return None
             except Exception as e:
                 logger.error(f"Error creating webhook: {e}")
-                return None
+                if webhook is not None:
+                    self._webhooks.cap_pool(key)  # e.g. the channel's webhook limit
+                return webhook
+
+    async def _deliver(self, webhook: discord.Webhook, attachments: List[discord.Attachment],
+                       thread: Optional[discord.Thread] = None, **kwargs):
+        async with self._webhooks.sending(webhook):
+            if not attachments:
+                if thread is not None:
+                    kwargs['thread'] = thread
+                return await webhook.send(wait=True, **kwargs)
+            payload = {k: v for k, v in kwargs.items() if v is not None}
+            return await stream_webhook_send(await self.get_session(), webhook, attachments,
+                                             self._upload_budget, payload, thread=thread)
+
+    async def _send_proxied(self, channel: discord.abc.Messageable, webhook: discord.Webhook,
+                            attachments: List[discord.Attachment], **kwargs):
+        """Send through ``webhook``, recreating it once if Discord reports it deleted or its token invalid.
+
+        ``channel`` may be a thread, in which case ``webhook`` belongs to its
+        parent and the message is posted into the thread. Attachments are
+        streamed from the CDN on each attempt rather than buffered.
+        """
+        parent, thread = self._webhook_target(channel)
+        try:
+            return await self._deliver(webhook, attachments, thread=thread, **kwargs)
+        except discord.NotFound as e:
+            if thread is not None and e.code == UNKNOWN_CHANNEL:
+                raise  # the thread is gone, not the webhook
+        except discord.HTTPException as e:
+            if e.code != INVALID_WEBHOOK_TOKEN:
+                raise
+        logger.info(f"Webhook {webhook.id} in channel {parent.id} is gone; recreating")
+        await self._webhooks.evict((parent.guild.id, parent.id), webhook.id)
+        webhook = await self.create_or_get_webhook(channel)
+        if not webhook:
+            return None
+        return await self._deliver(webhook, attachments, thread=thread, **kwargs)
 
     def parse_proxy_pattern(self, pattern: str) -> Tuple[Optional[str], Optional[str]]:
-        if not pattern:
-            return None, None
-        if pattern.endswith("None"):
-            pattern = pattern.replace("None", "")
-        if "TEXT" in pattern:
-            pre, suf = pattern.split("TEXT", 1)
-            return (pre or None, suf or None)
-        if ":" in pattern.lower():
-            parts = pattern.split(":", 1)
-            return (f"{parts[0]}:", None)
-        return (pattern.strip(), None)
+        return parse_proxy_pattern(pattern)
+
+    def _on_profile_change(self, user_id: str, profile: Optional[Dict[str, Any]]):
+        """Apply a single user's profile write to the caches instead of rebuilding them."""
+        self._matchers.invalidate(user_id)
+        if profile is None:
+            # Profile deleted: its autoproxy documents went with it.
+            prefix = f"{user_id}_"
+            for key in [k for k in self.autoproxy_settings if k == user_id or k.startswith(prefix)]:
+                del self.autoproxy_settings[key]
+
+    async def get_matcher(self, user_id: str) -> ProxyMatcher:
+        """Return the user's compiled proxy matcher, loading the profile only on a cache miss."""
+        matcher = self._matchers.get(user_id)
+        if matcher is None:
+            token = self._matchers.token()
+            profile = await db.get_profile(user_id)
+            matcher = ProxyMatcher(profile) if profile else NO_PROFILE
+            if db.db is not None:  # don't pin "no profile" while MongoDB is down
+                self._matchers.put(user_id, matcher, token)  # skipped if the profile changed meanwhile
+        return matcher
 
     @commands.command(name="set_proxy")
     async def set_proxy(self, ctx, alter_name: str = None, *, proxy_tag: str = None):
         if not alter_name or not proxy_tag:
             return await ctx.send("❌ Usage: `!set_proxy <alter_name> <proxy_tag>`")
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
-        if not profile.get('alters'):
-            return await ctx.send("❌ You don't have any alters set up.")
-        actual = find_alter_by_name(profile, alter_name)
-        if not actual:
+        found = await db.find_alter(user_id, alter_name)
+        if not found:
             return await ctx.send(f"❌ Alter '{alter_name}' not found.")
+        actual, _ = found
         if "text" in proxy_tag.lower() and "TEXT" not in proxy_tag:
             proxy_tag = proxy_tag.replace("text", "TEXT")
         if proxy_tag.endswith("None"):
             proxy_tag = proxy_tag.replace("None", "")
-        profile['alters'][actual]['proxy'] = proxy_tag
-        db.save_profile(user_id, profile)
-        await self.initialize_cache()
+        await db.update_alter_field(user_id, actual, 'proxy', proxy_tag)
         pre, suf = self.parse_proxy_pattern(proxy_tag)
         example = f"{f'`{pre}`' if pre else ''}Your message{f'`{suf}`' if suf else ''}"
         embed = create_embed(
@@ -179,19 +361,15 @@ class ProxyCommands(commands.Cog):
     async def proxy_management(self, ctx, action: str, alter_name: str = None, *, proxy_tag: str = None):
         if action.lower() == 'remove':
             user_id = str(ctx.author.id)
-            profile = db.get_profile(user_id)
-            if not profile.get('alters'):
-                return await ctx.send("❌ No alters to remove proxy from.")
-            actual = find_alter_by_name(profile, alter_name)
-            if not actual:
+            found = await db.find_alter(user_id, alter_name) if alter_name else None
+            if not found:
                 return await ctx.send(f"❌ Alter '{alter_name}' not found.")
-            profile['alters'][actual].pop('proxy', None)
-            db.save_profile(user_id, profile)
-            await self.initialize_cache()
+            actual, _ = found
+            await db.unset_alter_field(user_id, actual, 'proxy')
             return await ctx.send(f"✅ Removed proxy from **{actual}**.")
         if action.lower() == 'list':
             user_id = str(ctx.author.id)
-            profile = db.get_profile(user_id)
+            profile = await db.get_profile(user_id)
             alters = profile.get('alters', {})
             proxies = [f"**{an}**: `{ad['proxy']}`" for an, ad in alters.items() if ad.get('proxy')]
             if proxies:
@@ -199,96 +377,303 @@ class ProxyCommands(commands.Cog):
             return await ctx.send("❌ No proxies set.")
         return await ctx.send("❌ Invalid action. Use `remove` or `list`.")
 
+    # -- Proxied message log (see utils/message_store.py) ----------------------
+
+    async def _target_record(self, ctx, ref: Optional[str] = None) -> Optional[ProxiedMessage]:
+        """Resolve the proxied message a command acts on.
+
+        That is the message being replied to, else ``ref`` (a link or id),
+        else the author's last proxied message in this channel. Returns None
+        (after telling the user) if there is none or it isn't theirs.
+        """
+        message_id = None
+        if ctx.message.reference and ctx.message.reference.message_id:
+            message_id = ctx.message.reference.message_id
+        elif ref and (match := MESSAGE_REF.fullmatch(ref.strip('<>'))):
+            message_id = int(match.group(1))
+        if message_id is not None:
+            record = await self._message_cache.lookup(message_id)
+        else:
+            record = await self._message_cache.last_for(ctx.author.id, ctx.channel.id)
+        if record is None:
+            await ctx.send("❌ No proxied message found. Reply to one, or give its link.")
+            return None
+        if record.original_author != ctx.author.id:
+            await ctx.send("❌ You can only manage messages you proxied.")
+            return None
+        return record
+
+    async def _record_webhook(self, record: ProxiedMessage) -> Tuple[Optional[discord.Webhook], Dict[str, Any]]:
+        """Return the webhook that sent ``record`` and the ``thread=`` kwargs for calls on it."""
+        guild = self.bot.get_guild(record.guild_id)
+        channel = guild.get_channel_or_thread(record.channel_id) if guild else None
+        if channel is None or record.webhook_id is None:
+            return None, {}
+        parent, thread = self._webhook_target(channel)
+        if parent is None:
+            return None, {}
+        webhook = await self._webhooks.find((parent.guild.id, parent.id), record.webhook_id)
+        return webhook, {"thread": thread} if thread is not None else {}
+
+    async def _delete_proxied(self, record: ProxiedMessage) -> bool:
+        webhook, extra = await self._record_webhook(record)
+        if webhook is None:
+            return False
+        try:
+            async with self._webhooks.sending(webhook):
+                await webhook.delete_message(record.message_id, **extra)
+        except discord.NotFound:
+            pass  # already gone
+        await self._message_cache.remove(record.message_id)
+        return True
+
+    @staticmethod
+    async def _tidy(ctx):
+        """Delete the invoking command so the channel only shows the proxied messages."""
+        try:
+            await ctx.message.delete()
+        except discord.HTTPException:
+            pass
+
+    @commands.command(name="edit_proxy", aliases=["pe"])
+    async def edit_proxy(self, ctx, *, content: str = None):
+        """Edit a proxied message: `!edit_proxy [message_link] <new content>`."""
+        if not content:
+            return await ctx.send("❌ Usage: `!edit_proxy [message_link] <new_content>` (or reply to the message)")
+        ref, _, rest = content.partition(' ')
+        if not ctx.message.reference and rest.strip() and MESSAGE_REF.fullmatch(ref.strip('<>')):
+            content = rest.strip()
+        else:
+            ref = None
+        record = await self._target_record(ctx, ref)
+        if record is None:
+            return
+        webhook, extra = await self._record_webhook(record)
+        if webhook is None:
+            return await ctx.send("❌ That message's webhook is no longer available.")
+        try:
+            async with self._webhooks.sending(webhook):
+                await webhook.edit_message(record.message_id, content=content, **extra)
+        except discord.NotFound:
+            await self._message_cache.remove(record.message_id)
+            return await ctx.send("❌ That message no longer exists.")
+        await self._tidy(ctx)
+
+    @commands.command(name="delete_proxy", aliases=["pd"])
+    async def delete_proxy(self, ctx, ref: str = None):
+        """Delete a proxied message: `!delete_proxy [message_link]`."""
+        record = await self._target_record(ctx, ref)
+        if record is None:
+            return
+        if not await self._delete_proxied(record):
+            return await ctx.send("❌ That message's webhook is no longer available.")
+        await self._tidy(ctx)
+
+    @commands.command(name="reproxy", aliases=["rp"])
+    async def reproxy(self, ctx, alter_name: str = None, ref: str = None):
+        """Re-send a proxied message as another alter: `!reproxy <name> [message_link]`."""
+        if not alter_name:
+            return await ctx.send("❌ Usage: `!reproxy <alter_name> [message_link]` (or reply to the message)")
+        record = await self._target_record(ctx, ref)
+        if record is None:
+            return
+        user_id = str(ctx.author.id)
+        found = await db.find_alter(user_id, alter_name)
+        if not found:
+            return await ctx.send(f"❌ Alter '{alter_name}' not found.")
+        actual, alter_data = found
+        old_webhook, extra = await self._record_webhook(record)
+        if old_webhook is None:
+            return await ctx.send("❌ That message's webhook is no longer available.")
+        try:
+            old = await old_webhook.fetch_message(record.message_id, **extra)
+        except discord.NotFound:
+            await self._message_cache.remove(record.message_id)
+            return await ctx.send("❌ That message no longer exists.")
+
+        guild = self.bot.get_guild(record.guild_id)
+        channel = guild.get_channel_or_thread(record.channel_id)
+        webhook = await self.create_or_get_webhook(channel)
+        if not webhook:
+            return
+        webhook_name, avatar_url = self._webhook_identity(actual, alter_data, (await self.get_matcher(user_id)).system)
+        uploads, too_large = split_oversized(old.attachments, guild.filesize_limit)
+        content = old.content
+        if too_large:
+            links = "\n".join(att.url for att in too_large)
+            content = f"{content}\n{links}" if content.strip() else links
+        proxied = await self._send_proxied(channel, webhook, uploads,
+                                           content=content or None, username=webhook_name, avatar_url=avatar_url)
+        if proxied is None:
+            return
+        await self._delete_proxied(record)
+        self._message_cache.add(ProxiedMessage(
+            proxied.id, record.original_author, actual,
+            record.channel_id, record.guild_id, original_id=record.original_id, webhook_id=proxied.webhook_id
+        ))
+        await self._tidy(ctx)
+
+    @commands.command(name="last_proxy", aliases=["pl"])
+    async def last_proxy(self, ctx, ref: str = None):
+        """Show which alter sent one of your proxied messages (default: your last one here)."""
+        record = await self._target_record(ctx, ref)
+        if record is None:
+            return
+        link = f"https://discord.com/channels/{record.guild_id}/{record.channel_id}/{record.message_id}"
+        embed = create_embed(
+            title="📨 Proxied Message",
+            description=f"Sent as **{record.alter_name}** <t:{int(record.created)}:R>\n[Jump to message]({link})",
+        )
+        await ctx.send(embed=embed)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        if payload.guild_id is None or str(payload.emoji) != DELETE_REACTION:
+            return
+        record = await self._message_cache.lookup(payload.message_id)
+        if record is not None and record.original_author == payload.user_id:
+            await self._delete_proxied(record)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         if message.author.bot or message.content.startswith(self.bot.command_prefix):
             return
         if not message.guild:
             return
-        async with self._lock:
-            bl = db.get_blacklist(str(message.guild.id))
-            if message.channel.id in bl.get('channels', []) or \
-               (message.channel.category and message.channel.category.id in bl.get('categories', [])):
-                return
-            alter_data, alter_name = await self.find_matching_proxy(message)
-            if not alter_data:
-                return
+        # Same author in the same channel stays ordered; everything else runs in parallel.
+        key = (message.channel.id, message.author.id)
+        started = time.perf_counter()
+        result = "error"
+        try:
+            result = "proxied" if await self._dispatcher.run(key, self._proxy_message, message) else "skipped"
+        finally:
+            PROXY_SECONDS.observe(time.perf_counter() - started, result=result)
+
+    def queue_stats(self) -> Dict[str, int]:
+        """Return in-flight and queue-depth counters for the proxy dispatcher."""
+        return self._dispatcher.stats()
+
+    def context_stats(self) -> Dict[str, int]:
+        """Return DB reads/writes made on behalf of proxied messages."""
+        return dict(self._context_stats)
+
+    def webhook_stats(self) -> Dict[str, Any]:
+        """Return webhook registry counters plus per-webhook (per-bucket) send and 429 counts."""
+        return {**self._webhooks.stats(), "buckets": self._webhooks.bucket_stats()}
+
+    def _collect_metrics(self):
+        """Copy component stats into the /metrics gauges (see utils/metrics.py)."""
+        q = self._dispatcher.stats()
+        PROXY_IN_FLIGHT.set(q["in_flight"])
+        PROXY_QUEUED.set(q["queued"])
+        PROXY_ATTACHMENT_BYTES.set(self._upload_budget.stats()["in_use"])
+        w = self._webhooks.stats()
+        WEBHOOKS_CACHED.set(w["cached"])
+        WEBHOOK_SENDS.set(w["sends"])
+        WEBHOOK_RATE_LIMITED.set(w["rate_limited"])
+        MESSAGE_LOG_PENDING.set(self._message_cache.stats()["pending"])
+        c = self._context_stats
+        PROXY_CONTEXT_MESSAGES.set(c["messages"])
+        PROXY_DB_READS.set(c["db_reads"])
+        PROXY_DB_WRITES.set(c["db_writes"])
+
+    async def _proxy_message(self, message: discord.Message) -> bool:
+        """Proxy ``message`` if it matches; returns True if it was proxied."""
+        if not await startup.wait_ready("database"):
+            logger.warning(f"Skipped proxying message {message.id}: MongoDB is still not connected.")
+            return False
+        with PROXY_STAGE_SECONDS.time(stage="blacklist"):
+            if await blacklist_cache.is_blacklisted(message.channel):
+                return False
+        ctx = ProxyContext(self, message)
+        try:
+            return await self._proxy_with_context(ctx)
+        finally:
+            stats = self._context_stats
+            stats["messages"] += 1
+            stats["db_reads"] += ctx.reads
+            stats["db_writes"] += ctx.writes
+
+    async def _proxy_with_context(self, ctx: ProxyContext) -> bool:
+        message = ctx.message
+        with PROXY_STAGE_SECONDS.time(stage="match"):
+            alter_data, alter_name = await self.find_matching_proxy(message, ctx)
+        if not alter_data:
+            return False
+        with PROXY_STAGE_SECONDS.time(stage="webhook"):
             webhook = await self.create_or_get_webhook(message.channel)
-            if not webhook:
-                return
-            content = message.content
-            is_manual = alter_data.get('_is_manual_proxy', False)
-            if is_manual:
-                pre, suf = self.parse_proxy_pattern(alter_data['proxy'])
-                content = self._extract_message_content(content, pre, suf)
-            if not content.strip() and not message.attachments:
-                return
-            user_id = str(message.author.id)
-            profile = db.get_profile(user_id)
-            tag = profile.get('system', {}).get('tag', '').strip()
-            system_tag = f" {tag}" if tag else ''
-            display = alter_data.get('display_name')
-            webhook_name = f"{display}{system_tag}"[:80]
-            avatar_url = alter_data.get('proxy_avatar') or alter_data.get('avatar') or profile.get('system', {}).get('avatar')
-            files = []
-            for att in message.attachments:
-                data = await att.read()
-                files.append(discord.File(io.BytesIO(data), att.filename, spoiler=att.is_spoiler()))
-            proxied = await webhook.send(content=content or None, username=webhook_name, avatar_url=avatar_url, files=files, wait=True)
+        if not webhook:
+            return False
+        content = message.content
+        is_manual = alter_data.get('_is_manual_proxy', False)
+        if is_manual:
+            pre, suf = self.parse_proxy_pattern(alter_data['proxy'])
+            content = self._extract_message_content(content, pre, suf)
+        if not content.strip() and not message.attachments:
+            return False
+        webhook_name, avatar_url = self._webhook_identity(alter_name, alter_data, (await ctx.matcher()).system)
+        uploads, too_large = split_oversized(message.attachments, message.guild.filesize_limit)
+        if too_large:
+            # Over the upload limit: link the original CDN files instead of re-uploading.
+            links = "\n".join(att.url for att in too_large)
+            content = f"{content}\n{links}" if content.strip() else links
+        with PROXY_STAGE_SECONDS.time(stage="send"):
+            proxied = await self._send_proxied(message.channel, webhook, uploads,
+                                               content=content or None, username=webhook_name, avatar_url=avatar_url)
+        if proxied is None:
+            return False
+        with PROXY_STAGE_SECONDS.time(stage="delete"):
             try:
                 await message.delete()
             except:
                 pass
-            if is_manual:
-                key = f"{user_id}_{message.guild.id}"
-                ap = db.get_autoproxy(key)
-                if ap.get('mode') == 'latch':
-                    ap['last_alter'] = alter_name
-                    ap['guild_id'] = str(message.guild.id)
-                    db.save_autoproxy(key, ap)
-            self._message_cache[proxied.id] = {'original_author': message.author.id, 'alter_name': alter_name, 'timestamp': datetime.utcnow()}
-
-    def _check_pattern_match(self, content: str, prefix: Optional[str], suffix: Optional[str]) -> bool:
-        if prefix and not content.startswith(prefix):
-            return False
-        if suffix and not content.endswith(suffix):
-            return False
-        return bool(self._extract_message_content(content, prefix, suffix).strip())
+        if is_manual and (await ctx.autoproxy()).get('mode') == 'latch':
+            await ctx.update_autoproxy(last_alter=alter_name, guild_id=ctx.guild_id)
+        await ctx.commit()
+        self._message_cache.add(ProxiedMessage(
+            proxied.id, message.author.id, alter_name,
+            message.channel.id, message.guild.id, original_id=message.id, webhook_id=proxied.webhook_id
+        ))
+        return True
+
+    @staticmethod
+    def _webhook_identity(alter_name: str, alter_data: Dict[str, Any], system: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Return the (username, avatar url) an alter posts under."""
+        tag = (system.get('tag') or '').strip()
+        system_tag = f" {tag}" if tag else ''
+        display = alter_data.get('displayname') or alter_name
+        avatar_url = alter_data.get('proxy_avatar') or alter_data.get('avatar') or system.get('avatar')
+        return f"{display}{system_tag}"[:80], avatar_url
 
     def _extract_message_content(self, content: str, prefix: Optional[str], suffix: Optional[str]) -> str:
-        if prefix:
-            content = content[len(prefix):].lstrip()
-        if suffix:
-            content = content[:-len(suffix)].rstrip()
-        return content
-
-    async def find_matching_proxy(self, message: discord.Message) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
-        user_id = str(message.author.id)
-        guild_id = str(message.guild.id)
-        profile = db.get_profile(user_id) or {}
+        return extract_message_content(content, prefix, suffix)
+
+    async def _get_autoproxy(self, key: str) -> Dict[str, Any]:
+        if self._autoproxy_loaded:
+            return self.autoproxy_settings.get(key) or {"enabled": False, "mode": "off"}
+        return await db.get_autoproxy(key)
+
+    async def find_matching_proxy(self, message: discord.Message, ctx: Optional[ProxyContext] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        ctx = ctx or ProxyContext(self, message)
+        matcher = await ctx.matcher()
         # Manual patterns
-        for an, ad in profile.get('alters', {}).items():
-            if (pt := ad.get('proxy')):
-                pre, suf = self.parse_proxy_pattern(pt)
-                if self._check_pattern_match(message.content, pre, suf):
-                    ad_copy = ad.copy(); ad_copy['_is_manual_proxy'] = True
-                    return ad_copy, an
+        if (entry := matcher.match(message.content)):
+            ad_copy = entry.data.copy(); ad_copy['_is_manual_proxy'] = True
+            return ad_copy, entry.name
+        if not matcher.alters:
+            return None, None
         # Autoproxy
-        key = f"{user_id}_{guild_id}"
-        ap = db.get_autoproxy(key)
+        ap = await ctx.autoproxy()
         if ap.get('enabled'):
             mode = ap.get('mode')
             name = ap.get('last_alter') if mode == 'latch' else ap.get('fronter') if mode == 'front' else ap.get('member')
-            if name in profile.get('alters', {}):
-                ad_copy = profile['alters'][name].copy(); ad_copy['_is_manual_proxy'] = False
+            if name in matcher.alters:
+                ad_copy = matcher.alters[name].copy(); ad_copy['_is_manual_proxy'] = False
                 return ad_copy, name
         return None, None
 
 async def setup(bot):
+    # Caches are filled later by warm_up(), once MongoDB is connected.
     cog = ProxyCommands(bot)
-    try:
-        await cog.initialize_cache()
-    except Exception as e:
-        logger.error(f"❌ Failed proxy cache init: {e}")
     await bot.add_cog(cog)
     print("✅ Proxy cog loaded successfully")
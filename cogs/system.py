@@ -22,12 +22,6 @@ class SystemCommands(commands.Cog):
         logger.info(f"Instance {self.bot.instance_id} processing create_system for {ctx.author}")
         user_id = str(ctx.author.id)
 
-        profile = db.get_profile(user_id)
-        # If existing profile has a system key, user already has a system
-        if profile.get("system"):
-            await ctx.send("❌ You already have a system. Use `!edit_system` to modify it.")
-            return
-
         # Generate unique system ID
         system_id = str(uuid.uuid4())[:8]
         created_date = datetime.utcnow().isoformat()
@@ -49,7 +43,16 @@ class SystemCommands(commands.Cog):
             "alters": {},
             "folders": {}
         }
-        db.save_profile(user_id, new_profile)
+
+        def claim(profile):
+            # If existing profile has a system key, user already has a system
+            if profile.get("system"):
+                return False
+            profile.update(new_profile)
+
+        if await db.update_profile(user_id, claim, create=True) is None:
+            await ctx.send("❌ You already have a system. Use `!edit_system` to modify it.")
+            return
 
         embed = discord.Embed(
             title="✅ System Created Successfully",
@@ -65,7 +68,7 @@ class SystemCommands(commands.Cog):
     async def show_system(self, ctx):
         """Show system information."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         system_data = profile.get("system")
 
         if not system_data:
@@ -111,7 +114,7 @@ class SystemCommands(commands.Cog):
     async def edit_system(self, ctx):
         """Edit the current system."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         system_data = profile.get("system")
 
         if not system_data:
@@ -164,14 +167,10 @@ class SystemCommands(commands.Cog):
 
         try:
             msg = await self.bot.wait_for('message', timeout=60.0, check=mcheck)
-            profile = db.get_profile(user_id)
-            sys = profile.get('system', {})
             value = msg.content.strip()
             if field == 'color' and not value.startswith('#'):
                 return await ctx.send("❌ Invalid color format. Use hex like #FF5733.")
-            sys[field] = value
-            profile['system'] = sys
-            db.save_profile(user_id, profile)
+            await db.update_system_field(user_id, field, value)
             await ctx.send(f"✅ System {field} updated!")
         except asyncio.TimeoutError:
             await ctx.send("⏰ Edit timed out.")
@@ -180,7 +179,7 @@ class SystemCommands(commands.Cog):
     async def delete_system(self, ctx):
         """Delete the current system permanently."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         if not profile.get('system'):
             return await ctx.send("❌ No system to delete.")
 
@@ -199,7 +198,7 @@ class SystemCommands(commands.Cog):
         try:
             r, _ = await self.bot.wait_for('reaction_add', timeout=60.0, check=check)
             if str(r.emoji) == '✅':
-                db.delete_profile(user_id)
+                await db.delete_profile(user_id)
                 return await ctx.send("✅ Your system has been deleted.")
             await ctx.send("❌ Deletion cancelled.")
         except asyncio.TimeoutError:
@@ -209,7 +208,7 @@ class SystemCommands(commands.Cog):
     async def export_system(self, ctx):
         """Export your system data as a JSON file."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id)
         if not profile:
             return await ctx.send("❌ No system to export.")
 
@@ -243,7 +242,7 @@ class SystemCommands(commands.Cog):
         try:
             await self.bot.wait_for('reaction_add', timeout=60.0, check=c)
             sys_data['user_id'] = str(ctx.author.id)
-            db.save_profile(str(ctx.author.id), sys_data)
+            await db.save_profile(str(ctx.author.id), sys_data)
             await ctx.send("✅ System imported!")
         except asyncio.TimeoutError:
             await ctx.send("⏰ Import timed out.")
@@ -252,7 +251,7 @@ class SystemCommands(commands.Cog):
     async def set_system_tag(self, ctx, *, tag: str = None):
         """Set or view the system proxy tag."""
         user_id = str(ctx.author.id)
-        profile = db.get_profile(user_id)
+        profile = await db.get_profile(user_id, with_alters=False)
         sys = profile.get('system') or {}
         if not sys:
             return await ctx.send("❌ You need a system first.")
@@ -264,9 +263,7 @@ class SystemCommands(commands.Cog):
 
         if len(tag)>20:
             return await ctx.send("❌ Tag must be ≤20 characters.")
-        sys['tag'] = tag
-        profile['system'] = sys
-        db.save_profile(user_id, profile)
+        await db.update_system_field(user_id, 'tag', tag)
         await ctx.send(f"🏷️ System tag updated to `{tag}`")
 
 async def setup(bot):
@@ -1,6 +1,7 @@
 import os
+import hmac
+import asyncio
 import discord
-import threading
 import importlib
 import sys
 import traceback
@@ -8,10 +9,16 @@ import logging
 import uuid
 from dotenv import load_dotenv
 from discord.ext import commands, tasks
-from flask import Flask, jsonify
+from aiohttp import web
 from datetime import datetime
+from typing import Optional
 
-from utils.mongodb import db
+from utils.mongodb import db, VersionConflict
+from utils.cache_sync import coherence
+from utils.startup import startup, StartupPending
+from utils.metrics import metrics, loop_lag
+from utils.health import health
+from utils.profiler import profiler, PROFILE_ENABLED, PROFILE_TOKEN
 
 # Set up logging
 logging.basicConfig(
@@ -27,24 +34,58 @@ logger = logging.getLogger('pixel')
 # Load environment variables from .env file
 load_dotenv()
 
-# Create Flask app for web server
-app = Flask(__name__)
+# HTTP surface (status, health probes, metrics), served on the bot's own event loop
+routes = web.RouteTableDef()
 
-@app.route("/")
-def home():
-    return "Bot is running!"
+@routes.get("/")
+async def home(request):
+    return web.Response(text="Bot is running!")
 
-@app.route("/discord-bot")
-def discord_bot_status():
-    return "Discord Bot is online!"
+@routes.get("/discord-bot")
+async def discord_bot_status(request):
+    return web.Response(text="Discord Bot is online!")
 
-@app.route("/health")
-def health_check():
-    return "Health Check: OK", 200
+def _probe(result):
+    ok, detail = result
+    return web.json_response({"status": "ok" if ok else "unavailable", **detail}, status=200 if ok else 503)
 
-def run_flask():
-    port = int(os.environ.get("PORT", 5000)) 
-    app.run(host="0.0.0.0", port=port)
+@routes.get("/health")
+@routes.get("/health/ready")
+async def health_ready(request):
+    return _probe(health.ready())
+
+@routes.get("/health/live")
+async def health_live(request):
+    return _probe(health.live())
+
+@routes.get("/startup")
+async def startup_status(request):
+    return web.json_response(startup.timings())
+
+async def profile_report(request):
+    """Profiler report, stall stacks included. Only registered when PROFILE_TOKEN is set."""
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(supplied.encode(), PROFILE_TOKEN.encode()):
+        return web.json_response({"error": "unauthorized"}, status=401)
+    try:
+        limit = int(request.query.get("limit", 20))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= 1000:
+        return web.json_response({"error": "limit must be an integer from 1 to 1000"}, status=400)
+    return web.json_response(profiler.report(limit))
+
+@routes.get("/metrics")
+async def metrics_endpoint(request):
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+def create_web_app(bot: commands.Bot) -> web.Application:
+    app = web.Application()
+    app["bot"] = bot
+    app.add_routes(routes)
+    if PROFILE_TOKEN:
+        app.router.add_get("/debug/profile", profile_report)
+    return app
 
 # Set up Discord bot with necessary intents
 intents = discord.Intents.default()
@@ -54,6 +95,9 @@ intents.message_content = True
 intents.reactions = True
 intents.members = True
 
+GATEWAY_LATENCY = metrics.gauge("pixel_gateway_latency_seconds", "Discord gateway heartbeat latency.")
+GUILDS = metrics.gauge("pixel_guilds", "Guilds the bot is in.")
+
 class PixelBot(commands.Bot):
     def __init__(self):
         super().__init__(command_prefix="!", intents=intents)
@@ -70,14 +114,99 @@ class PixelBot(commands.Bot):
         ]
         self.current_status = 0
         self._loaded_cogs = set()
+        self._alters_migration: Optional[asyncio.Task] = None
+        self._switch_migration: Optional[asyncio.Task] = None
+        self._warm_up_task: Optional[asyncio.Task] = None
+        self.gateway_connected = False
+        self._web_runner: Optional[web.AppRunner] = None
+        metrics.add_collector(self._collect_metrics)
         
     async def setup_hook(self):
-        """This is called when the bot starts, before logging in."""
-        # MongoDB connection is now handled in main section before bot startup
-        await self.load_extensions()
-        
+        """This is called when the bot starts, before logging in.
+
+        Only extension loading happens here. MongoDB and the cog caches come
+        up in the background so the gateway connects straight away; commands
+        and proxying wait on the "database" stage (see utils/startup.py).
+        """
+        await self.start_web_server()
+        loop_lag.start()
+        health.start(self)
+        if PROFILE_ENABLED:
+            profiler.enable()
+        async with startup.phase("extensions"):
+            await self.load_extensions()
+        self._warm_up_task = asyncio.create_task(self._warm_up())
+        startup.begin("gateway")
+
+    async def start_web_server(self):
+        """Serve the HTTP routes on this loop, on $PORT (default 5000)."""
+        port = int(os.environ.get("PORT", 5000))
+        runner = web.AppRunner(create_web_app(self), access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host="0.0.0.0", port=port).start()
+        except OSError as e:
+            logger.error(f"❌ Could not start web server on port {port}: {e}")
+            await runner.cleanup()
+            return
+        self._web_runner = runner
+        logger.info(f"🌐 Web server listening on port {port}")
+
+    async def _warm_up(self):
+        """Connect to MongoDB (retrying), then warm every cog's caches concurrently."""
+        async with startup.phase("database"):
+            delay = 1.0
+            while True:
+                await db.connect()
+                if db.db is not None:
+                    break
+                logger.warning(f"🔌 MongoDB unavailable; retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+            # Keep this instance's caches in step with writes made by other instances
+            coherence.start({
+                "profiles": db.profiles,
+                "autoproxy": db.autoproxy,
+                "blacklists": db.blacklists,
+                "webhooks": db.webhooks,
+                "alters": db.alters,
+            })
+
+        # Legacy ISO-string switch timestamps neither sort against dates nor expire
+        self._switch_migration = asyncio.create_task(db.migrate_switch_timestamps())
+        if os.getenv("ALTERS_LAYOUT", "embedded").lower() == "collection":
+            # Move embedded alters into their own collection while serving traffic
+            self._alters_migration = asyncio.create_task(db.migrate_all_alters(
+                batch_size=int(os.getenv("ALTERS_MIGRATION_BATCH", 100))
+            ))
+
+        async with startup.phase("caches"):
+            cogs = [cog for cog in self.cogs.values() if hasattr(cog, "warm_up")]
+            results = await asyncio.gather(*(cog.warm_up() for cog in cogs), return_exceptions=True)
+            for cog, result in zip(cogs, results):
+                if isinstance(result, Exception):
+                    logger.error(f"❌ Failed to warm up {cog.qualified_name}: {result}")
+
+    async def invoke(self, ctx):
+        """Run the command, timed by the profiler when it is enabled (see utils/profiler.py)."""
+        if profiler.enabled and ctx.command is not None:
+            return await profiler.run(f"command:{ctx.command.qualified_name}", super().invoke(ctx))
+        return await super().invoke(ctx)
+
+    def _schedule_event(self, coro, event_name, *args, **kwargs):
+        # Every event handler, Cog.listener ones included, is scheduled through here.
+        if profiler.enabled:
+            coro = profiler.wrap(coro, f"listener:{getattr(coro, '__qualname__', event_name)}")
+        return super()._schedule_event(coro, event_name, *args, **kwargs)
+
+    async def bot_check(self, ctx):
+        """Hold commands until MongoDB is connected, instead of failing them."""
+        if not await startup.wait_ready("database"):
+            raise StartupPending("Still starting up.")
+        return True
+
     async def load_extensions(self):
-        """Load all extensions from the cogs directory."""
+        """Load all extensions from the cogs directory, concurrently."""
         for directory in ["cogs"]:
             try:
                 if not os.path.exists(directory):
@@ -87,22 +216,57 @@ class PixelBot(commands.Bot):
                         if f.endswith('.py') and not f.startswith('__')]
                 
                 logger.info(f"🔎 Scanning folder: {directory} → {files}")
-                
-                for filename in files:
-                    ext = f"{directory}.{filename[:-3]}"
-                    if ext not in self._loaded_cogs:
-                        try:
-                            await self.load_extension(ext)
-                            self._loaded_cogs.add(ext)
-                            logger.info(f"✅ Loaded extension: {ext}")
-                        except Exception as e:
-                            logger.error(f"❌ Failed to load {ext}: {str(e)}")
-                            traceback.print_exception(type(e), e, e.__traceback__)
+
+                exts = [f"{directory}.{filename[:-3]}" for filename in files]
+                exts = [ext for ext in exts if ext not in self._loaded_cogs]
+                results = await asyncio.gather(*(self.load_extension(ext) for ext in exts), return_exceptions=True)
+                for ext, result in zip(exts, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"❌ Failed to load {ext}: {str(result)}")
+                        traceback.print_exception(type(result), result, result.__traceback__)
+                    else:
+                        self._loaded_cogs.add(ext)
+                        logger.info(f"✅ Loaded extension: {ext}")
             except Exception as e:
                 logger.error(f"❌ Error loading from {directory}: {str(e)}")
 
+    async def close(self):
+        """Shut down the gateway connection, flush buffered writes, release the MongoDB pool, then stop the web server."""
+        await super().close()
+        self.gateway_connected = False
+        profiler.disable()
+        await health.stop()
+        await loop_lag.stop()
+        for task in (self._warm_up_task, self._alters_migration, self._switch_migration):
+            if task is not None:
+                task.cancel()
+        await coherence.stop()
+        await db.flush_writes()
+        db.close()
+        if self._web_runner is not None:
+            # Probes keep answering (as not ready) until everything else is down.
+            await self._web_runner.cleanup()
+            self._web_runner = None
+
+    def _collect_metrics(self):
+        if self.latency == self.latency:  # NaN until the first heartbeat
+            GATEWAY_LATENCY.set(self.latency)
+        GUILDS.set(len(self.guilds))
+
+    async def on_connect(self):
+        self.gateway_connected = True
+
+    async def on_resumed(self):
+        self.gateway_connected = True
+
+    async def on_disconnect(self):
+        self.gateway_connected = False
+
     async def on_ready(self):
         """Called when the bot is ready."""
+        self.gateway_connected = True
+        if not startup.is_ready("gateway"):
+            startup.mark("gateway")
         logger.info('------')
         logger.info(f'Logged in as {self.user.name} | {self.user.id}')
         logger.info(f'Bot instance {self.instance_id} is ready!')
@@ -150,6 +314,14 @@ class PixelBot(commands.Bot):
         if isinstance(error, commands.BadArgument):
             await ctx.send(f"❌ Invalid argument: {str(error)}")
             return
+
+        if isinstance(error, StartupPending):
+            await ctx.send("⏳ PIXEL is still starting up. Please try again in a moment.")
+            return
+
+        if isinstance(getattr(error, "original", None), VersionConflict):
+            await ctx.send("❌ Your profile was changed by another command at the same time. Please try again.")
+            return
             
         # Log unexpected errors
         logger.error(f'Error in command {ctx.command}: {str(error)}')
@@ -206,13 +378,6 @@ class PixelBot(commands.Bot):
 bot = PixelBot()
 
 if __name__ == "__main__":
-    # Start the Flask web server in a separate thread
-    threading.Thread(target=run_flask, daemon=True).start()
-    
-    # **MUST** connect to MongoDB _before_ loading any commands
-    logger.info("🔌 Connecting to MongoDB before bot startup...")
-    db.connect()
-    
     # Get token
     token = None
     for var in ("DISCORD_TOKEN", "BOT_TOKEN", "NEW_BOT_TOKEN"):
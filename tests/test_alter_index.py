@@ -0,0 +1,64 @@
+import random
+import string
+
+import pytest
+
+from utils.alter_index import AlterIndex
+
+
+def linear_find(alters, search_name):
+    """The two-pass scan find_alter_by_name used before AlterIndex."""
+    name_lower = search_name.lower()
+    for name, data in alters.items():
+        if name.lower() == name_lower:
+            return name
+        if (data.get('displayname') or '').lower() == name_lower:
+            return name
+        if any(alias.lower() == name_lower for alias in data.get('aliases') or [] if alias):
+            return name
+    for name, data in alters.items():
+        if name_lower in name.lower():
+            return name
+        if name_lower in (data.get('displayname') or '').lower():
+            return name
+        if any(name_lower in alias.lower() for alias in data.get('aliases') or [] if alias):
+            return name
+    return None
+
+
+ALTERS = {
+    "Ash": {"displayname": "Ashley", "aliases": ["A", "ash-b"]},
+    "ashley": {"displayname": None, "aliases": []},
+    "Birch": {"displayname": "", "aliases": ["", "Bee", None]},
+    "Cedar": {"aliases": ["ASH"]},
+    "Dawn": {"displayname": "Cedric"},
+}
+
+
+@pytest.mark.parametrize("query", [
+    "ash", "ASHLEY", "ashl", "a", "bee", "b", "ced", "cedric", "edr", "ar",
+    "", "missing", "sh-", "ash-b",
+])
+def test_find_matches_linear_scan(query):
+    assert AlterIndex(ALTERS).find(query) == linear_find(ALTERS, query)
+
+
+def test_find_matches_linear_scan_on_random_profiles():
+    rng = random.Random(1234)
+    alphabet = "abcdeAB"
+
+    def word(low=1, high=6):
+        return "".join(rng.choice(alphabet) for _ in range(rng.randint(low, high)))
+
+    for _ in range(50):
+        alters = {}
+        for _ in range(rng.randint(0, 40)):
+            alters[word(2, 8)] = {
+                "displayname": rng.choice([None, "", word()]),
+                "aliases": [rng.choice(["", word()]) for _ in range(rng.randint(0, 3))],
+            }
+        index = AlterIndex(alters)
+        queries = [word(0, 5) for _ in range(40)]
+        queries += ["".join(rng.sample(string.ascii_letters, 4)) for _ in range(5)]
+        for query in queries:
+            assert index.find(query) == linear_find(alters, query), query
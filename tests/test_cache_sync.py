@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime
+
+from pymongo.errors import OperationFailure
+
+from utils.cache_sync import CacheCoherence
+
+
+class FakeStream:
+    def __init__(self, changes):
+        self.changes = changes
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        change = await self.changes.get()
+        self.resume_token = {"_data": id(change)}
+        return change
+
+
+class FakeCollection:
+    """Stands in for a Motor collection: ``watch()`` and ``find()`` on ``updated_at``."""
+
+    def __init__(self, change_streams=True):
+        self.change_streams = change_streams
+        self.changes = asyncio.Queue()
+        self.docs = []
+
+    def watch(self, **kwargs):
+        if not self.change_streams:
+            raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+        return FakeStream(self.changes)
+
+    async def find(self, query):
+        since = query["updated_at"]["$gt"]
+        for doc in list(self.docs):
+            if doc.get("updated_at", "") > since:
+                yield doc
+
+
+def recorder():
+    calls = []
+    return calls, lambda key, doc: calls.append((key, doc))
+
+
+async def until(predicate, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def test_change_stream_invalidates_by_key():
+    async def scenario():
+        coherence = CacheCoherence(poll_interval=0.01, ttl=60)
+        calls, handler = recorder()
+        coherence.subscribe("profiles", handler)
+        profiles = FakeCollection()
+        coherence.start({"profiles": profiles})
+        doc = {"_id": 1, "user_id": "u1"}
+        await profiles.changes.put({"operationType": "update", "documentKey": {"_id": 1}, "fullDocument": doc})
+        await profiles.changes.put({"operationType": "delete", "documentKey": {"_id": 1}})
+        await until(lambda: len(calls) == 2)
+        await coherence.stop()
+        assert calls == [("u1", doc), ("u1", None)]
+        assert coherence.stats()["modes"] == {"profiles": "change_stream"}
+
+    asyncio.run(scenario())
+
+
+def test_polling_fallback_invalidates_newer_documents_once():
+    async def scenario():
+        coherence = CacheCoherence(poll_interval=0.01, ttl=60)
+        calls, handler = recorder()
+        coherence.subscribe("alters", handler)
+        alters = FakeCollection(change_streams=False)
+        alters.docs.append({"user_id": "old", "updated_at": "2000-01-01T00:00:00"})
+        coherence.start({"alters": alters})
+        await until(lambda: coherence.stats()["modes"].get("alters") == "polling")
+        doc = {"user_id": "u1", "updated_at": datetime.utcnow().isoformat()}
+        alters.docs.append(doc)
+        await until(lambda: calls)
+        await asyncio.sleep(0.05)  # later polls must not replay it
+        await coherence.stop()
+        assert calls == [("u1", doc)]
+
+    asyncio.run(scenario())
+
+
+def test_polling_fallback_drops_everything_every_ttl():
+    async def scenario():
+        coherence = CacheCoherence(poll_interval=0.01, ttl=0.02)
+        calls, handler = recorder()
+        coherence.subscribe("webhooks", handler)
+        coherence.start({"webhooks": FakeCollection(change_streams=False)})
+        await until(lambda: (None, None) in calls)
+        await coherence.stop()
+        assert coherence.stats()["full_invalidations"] >= 1
+
+    asyncio.run(scenario())
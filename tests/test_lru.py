@@ -0,0 +1,45 @@
+from utils.lru import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_put_after_invalidation_is_skipped():
+    cache = LRUCache(10)
+    token = cache.token()  # value built from a read taken here...
+    cache.invalidate("a")  # ...then the key is written
+    assert cache.put("a", "stale", token) is False
+    assert cache.get("a") is None
+    assert cache.put("a", "fresh", cache.token()) is True
+    assert cache.get("a") == "fresh"
+
+
+def test_invalidating_another_key_keeps_the_fill():
+    cache = LRUCache(10)
+    token = cache.token()
+    cache.invalidate("b")
+    assert cache.put("a", 1, token) is True
+
+
+def test_clear_refuses_fills_started_before_it():
+    cache = LRUCache(10)
+    token = cache.token()
+    cache.clear()
+    assert cache.put("a", 1, token) is False
+    assert cache.put("a", 1, cache.token()) is True
+
+
+def test_forgotten_invalidations_err_towards_not_caching():
+    cache = LRUCache(2)
+    token = cache.token()
+    for key in ("a", "b", "c"):  # "a"'s stamp falls out of the bounded record
+        cache.invalidate(key)
+    assert cache.put("a", 1, token) is False
+    assert cache.put("a", 1, cache.token()) is True
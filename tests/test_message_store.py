@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from utils import message_store
+from utils.message_store import ProxiedMessage, ProxiedMessageStore
+
+
+class SlowDB:
+    """Stands in for ``utils.mongodb.db``; each insert waits until released."""
+
+    def __init__(self):
+        self.saved = {}
+        self.deleted = []
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def save_proxied_messages(self, docs):
+        self.calls += 1
+        await self.release.wait()
+        for doc in docs:
+            self.saved[doc["message_id"]] = doc
+
+    async def delete_proxied_message(self, message_id):
+        self.deleted.append(message_id)
+        self.saved.pop(message_id, None)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    def install():
+        fake = SlowDB()
+        monkeypatch.setattr(message_store, "db", fake)
+        return fake
+    return install
+
+
+def record(message_id):
+    return ProxiedMessage(message_id, 1, "alter", 10, 20, webhook_id=30)
+
+
+def test_batch_flush_overlapping_running_flush_keeps_every_record(fake_db):
+    async def scenario():
+        db = fake_db()
+        store = ProxiedMessageStore(batch_size=2, flush_interval=60)
+        store.add(record(1))
+        store.add(record(2))           # first batch: flush starts and blocks in the insert
+        await asyncio.sleep(0.01)
+        assert db.calls == 1
+        store.add(record(3))
+        store.add(record(4))           # second batch reached while the first is in flight
+        await asyncio.sleep(0.01)
+        db.release.set()
+        await asyncio.sleep(0.01)
+        await store.close()
+        return db
+
+    db = asyncio.run(scenario())
+    assert sorted(db.saved) == [1, 2, 3, 4]
+
+
+def test_cancelled_flush_requeues_its_batch(fake_db):
+    async def scenario():
+        db = fake_db()
+        store = ProxiedMessageStore(batch_size=2, flush_interval=60)
+        store.add(record(1))
+        store.add(record(2))
+        await asyncio.sleep(0.01)
+        store._flush_task.cancel()     # e.g. cog unload mid-write
+        await asyncio.sleep(0.01)
+        assert store.stats()["pending"] == 2
+        db.release.set()
+        await store.close()
+        return db
+
+    db = asyncio.run(scenario())
+    assert sorted(db.saved) == [1, 2]
+
+
+def test_remove_waits_for_in_flight_insert(fake_db):
+    async def scenario():
+        db = fake_db()
+        store = ProxiedMessageStore(batch_size=1, flush_interval=60)
+        store.add(record(1))
+        await asyncio.sleep(0.01)      # insert of 1 is in flight
+        removal = asyncio.create_task(store.remove(1))
+        await asyncio.sleep(0.01)
+        assert db.deleted == []        # delete must not overtake the insert
+        db.release.set()
+        await removal
+        await store.close()
+        return db
+
+    db = asyncio.run(scenario())
+    assert db.deleted == [1]
+    assert 1 not in db.saved
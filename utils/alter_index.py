@@ -0,0 +1,109 @@
+import os
+from typing import Any, Dict, List, Optional, Set
+
+from utils.lru import LRUCache
+from utils.metrics import record_cache
+
+# Profiles whose ``alters_layout`` is "collection" keep their alters in the
+# ``alters`` collection instead of the embedded ``alters`` dict.
+COLLECTION_LAYOUT = "collection"
+
+# Length of the substrings indexed for partial matches.
+GRAM = 3
+
+
+class AlterIndex:
+    """Lowercased name/display name/alias index over one profile's alters.
+
+    Exact lookups are a single dict hit. Partial lookups intersect the
+    trigram posting lists of the query and only verify the few alters left;
+    queries shorter than a trigram scan the pre-lowered keys. Ranking is the
+    same as the old linear scan: any exact match beats any partial match,
+    and among matches the alter that comes first in the profile wins.
+    """
+
+    __slots__ = ("names", "version", "_keys", "_exact", "_grams")
+
+    def __init__(self, alters: Dict[str, Dict[str, Any]], version: Optional[int] = None):
+        self.names: List[str] = list(alters)
+        self.version = version
+        self._keys: List[tuple] = []
+        self._exact: Dict[str, int] = {}
+        self._grams: Dict[str, Set[int]] = {}
+
+        for order, (name, data) in enumerate(alters.items()):
+            keys = [name.lower(), (data.get('displayname') or '').lower()]
+            keys.extend(alias.lower() for alias in data.get('aliases') or [] if alias)
+            self._keys.append(tuple(keys))
+            for key in keys:
+                self._exact.setdefault(key, order)
+                for i in range(len(key) - GRAM + 1):
+                    self._grams.setdefault(key[i:i + GRAM], set()).add(order)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def find(self, query: str) -> Optional[str]:
+        """Return the internal name of the best-matching alter, or None."""
+        query = query.lower()
+        order = self._exact.get(query)
+        if order is not None:
+            return self.names[order]
+        if len(query) < GRAM:
+            candidates = range(len(self.names))
+        else:
+            postings = []
+            for i in range(len(query) - GRAM + 1):
+                posting = self._grams.get(query[i:i + GRAM])
+                if not posting:
+                    return None
+                postings.append(posting)
+            postings.sort(key=len)
+            candidates = sorted(postings[0].intersection(*postings[1:]))
+        for order in candidates:
+            if any(query in key for key in self._keys[order]):
+                return self.names[order]
+        return None
+
+
+class AlterIndexCache:
+    """Per-user :class:`AlterIndex` cache, bounded LRU.
+
+    An entry is reused only while the profile's ``version`` is unchanged,
+    so writes from other instances are picked up on the next lookup; local
+    saves also drop the entry via :meth:`invalidate`.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self._entries = LRUCache(max_size or int(os.getenv("ALTER_INDEX_CACHE_SIZE", 1024)))
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, profile: Dict[str, Any]) -> AlterIndex:
+        alters = profile.get('alters') or {}
+        user_id = profile.get('user_id')
+        version = profile.get('version')
+        if user_id is None or version is None or profile.get('alters_layout') == COLLECTION_LAYOUT:
+            # Nothing reliable to key an entry on: unsaved, pre-versioning, or
+            # alters edited in their own collection without bumping the version.
+            return AlterIndex(alters)
+        index = self._entries.get(user_id)
+        if index is not None and index.version == version and len(index) == len(alters):
+            self.hits += 1
+            record_cache("alter_index", True)
+            return index
+        self.misses += 1
+        record_cache("alter_index", False)
+        index = AlterIndex(alters, version)
+        self._entries.put(user_id, index)
+        return index
+
+    def invalidate(self, user_id: str, doc: Optional[Dict[str, Any]] = None) -> None:
+        self._entries.invalidate(user_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._entries.stats(), "hits": self.hits, "misses": self.misses}
+
+
+# Global instance, dropped per user whenever a profile is saved (see utils/mongodb.py)
+alter_indexes = AlterIndexCache()
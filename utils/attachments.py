@@ -0,0 +1,126 @@
+import json
+import asyncio
+import logging
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
+
+import aiohttp
+import discord
+
+logger = logging.getLogger(__name__)
+
+MAX_SEND_ATTEMPTS = 3
+
+
+class SentMessage(NamedTuple):
+    """The ids of a message sent by :func:`stream_webhook_send`."""
+
+    id: int
+    webhook_id: int
+
+
+class ByteBudget:
+    """Global cap on attachment bytes being re-uploaded at once.
+
+    A transfer larger than the whole budget is charged the full budget, so
+    it waits for every other transfer to finish rather than deadlocking.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.in_use = 0
+        self.waiting = 0
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> AsyncIterator[None]:
+        nbytes = min(max(0, nbytes), self.capacity)
+        async with self._cond:
+            self.waiting += 1
+            try:
+                await self._cond.wait_for(lambda: self.in_use + nbytes <= self.capacity)
+            finally:
+                self.waiting -= 1
+            self.in_use += nbytes
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.in_use -= nbytes
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        return {"capacity": self.capacity, "in_use": self.in_use, "waiting": self.waiting}
+
+
+def split_oversized(attachments: List[discord.Attachment], limit: int):
+    """Split attachments into (uploadable, too_large) by the per-file size limit."""
+    uploadable = [a for a in attachments if a.size <= limit]
+    too_large = [a for a in attachments if a.size > limit]
+    return uploadable, too_large
+
+
+async def _raise_for_discord_status(resp: aiohttp.ClientResponse) -> None:
+    try:
+        data: Any = await resp.json(content_type=None)
+    except (ValueError, aiohttp.ContentTypeError):
+        data = await resp.text()
+    if resp.status == 403:
+        raise discord.Forbidden(resp, data)
+    if resp.status == 404:
+        raise discord.NotFound(resp, data)
+    if resp.status >= 500:
+        raise discord.DiscordServerError(resp, data)
+    raise discord.HTTPException(resp, data)
+
+
+async def stream_webhook_send(
+    session: aiohttp.ClientSession,
+    webhook: discord.Webhook,
+    attachments: List[discord.Attachment],
+    budget: ByteBudget,
+    payload: Dict[str, Any],
+    thread: Optional[discord.abc.Snowflake] = None,
+) -> SentMessage:
+    """Execute ``webhook`` with ``attachments`` piped from the Discord CDN.
+
+    Each attachment is read from the CDN response in chunks and written
+    straight into the multipart upload, so files are never held in memory
+    whole. Returns the new message's id and the id of the webhook that sent it.
+    """
+    params = {"wait": "true"}
+    if thread is not None:
+        params["thread_id"] = str(thread.id)
+    body = dict(payload)
+    body["attachments"] = [
+        {"id": i, "filename": att.filename, **({"description": att.description} if att.description else {})}
+        for i, att in enumerate(attachments)
+    ]
+    total = sum(att.size for att in attachments)
+
+    async with budget.reserve(total):
+        for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+            async with AsyncExitStack() as stack:
+                form = aiohttp.FormData()
+                form.add_field("payload_json", json.dumps(body), content_type="application/json")
+                for i, att in enumerate(attachments):
+                    src = await stack.enter_async_context(session.get(att.url))
+                    src.raise_for_status()
+                    form.add_field(
+                        f"files[{i}]",
+                        src.content,
+                        filename=att.filename,
+                        content_type=att.content_type or "application/octet-stream",
+                    )
+                async with session.post(webhook.url, params=params, data=form) as resp:
+                    if resp.status == 429 and attempt < MAX_SEND_ATTEMPTS:
+                        data = await resp.json(content_type=None)
+                        retry_after = float(data.get("retry_after", 1.0))
+                        logger.warning(f"Webhook {webhook.id} rate limited; retrying in {retry_after:.2f}s")
+                        await asyncio.sleep(retry_after)
+                        continue
+                    if resp.status >= 300:
+                        await _raise_for_discord_status(resp)
+                    data = await resp.json()
+                    return SentMessage(int(data["id"]), int(data.get("webhook_id") or webhook.id))
+    raise RuntimeError("unreachable")
@@ -1,35 +1,71 @@
-from typing import List
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+import discord
+
 from utils.mongodb import db
+from utils.cache_sync import coherence
+from utils.metrics import record_cache
+
+
+class BlacklistCache:
+    """Guild-keyed in-memory blacklist, held as frozensets of channel/category IDs.
 
+    Each guild is read from MongoDB once; after that ``is_blacklisted`` is
+    pure set lookups. Entries are refreshed whenever ``db.save_blacklist``
+    runs on this instance, or another instance's write arrives via
+    :mod:`utils.cache_sync`.
+    """
 
-def load_channel_blacklist(guild_id: str) -> List[str]:
-    """Return list of blacklisted channel IDs for the given guild from MongoDB."""
-    bl = db.get_blacklist(guild_id)
-    return bl.get("channels", [])
+    def __init__(self):
+        self._entries: Dict[str, Tuple[FrozenSet[int], FrozenSet[int]]] = {}
 
+    @staticmethod
+    def _freeze(doc: Optional[Dict[str, Any]]) -> Tuple[FrozenSet[int], FrozenSet[int]]:
+        doc = doc or {}
+        return (
+            frozenset(int(c) for c in doc.get("channels") or []),
+            frozenset(int(c) for c in doc.get("categories") or []),
+        )
 
-def save_channel_blacklist(guild_id: str, channels: List[str]) -> None:
-    """Save list of blacklisted channel IDs for the given guild to MongoDB."""
-    bl = db.get_blacklist(guild_id)
-    # preserve existing categories
-    categories = bl.get("categories", [])
-    db.save_blacklist(guild_id, {"channels": channels, "categories": categories})
+    def apply(self, guild_id: Optional[str], doc: Optional[Dict[str, Any]]) -> None:
+        """Replace (or, with ``guild_id`` None, drop) cached entries after a write."""
+        if guild_id is None:
+            self._entries.clear()
+        elif doc and ("channels" in doc or "categories" in doc):
+            self._entries[guild_id] = self._freeze(doc)
+        else:
+            self._entries.pop(guild_id, None)
 
+    async def load_all(self) -> None:
+        """Bulk-load every guild's blacklist (cold start)."""
+        if db.blacklists is None:
+            return
+        async for doc in db.blacklists.find({}):
+            if doc.get("guild_id"):
+                self._entries[doc["guild_id"]] = self._freeze(doc)
 
-def load_category_blacklist(guild_id: str) -> List[str]:
-    """Return list of blacklisted category IDs for the given guild from MongoDB."""
-    bl = db.get_blacklist(guild_id)
-    return bl.get("categories", [])
+    async def get(self, guild_id: str) -> Tuple[FrozenSet[int], FrozenSet[int]]:
+        entry = self._entries.get(guild_id)
+        record_cache("blacklist", entry is not None)
+        if entry is None:
+            entry = self._entries[guild_id] = self._freeze(await db.get_blacklist(guild_id))
+        return entry
 
+    async def is_blacklisted(self, channel: discord.abc.GuildChannel) -> bool:
+        """True if the channel, a thread's parent, or their category is blacklisted."""
+        channels, categories = await self.get(str(channel.guild.id))
+        if not channels and not categories:
+            return False
+        if channel.id in channels:
+            return True
+        parent_id = getattr(channel, "parent_id", None)
+        if parent_id is not None and parent_id in channels:
+            return True
+        category_id = getattr(channel, "category_id", None)
+        return category_id is not None and category_id in categories
 
-def save_category_blacklist(guild_id: str, categories: List[str]) -> None:
-    """Save list of blacklisted category IDs for the given guild to MongoDB."""
-    bl = db.get_blacklist(guild_id)
-    # preserve existing channels
-    channels = bl.get("channels", [])
-    db.save_blacklist(guild_id, {"channels": channels, "categories": categories})
 
+blacklist_cache = BlacklistCache()
+db.add_listener("blacklists", blacklist_cache.apply)
+coherence.subscribe("blacklists", blacklist_cache.apply)
 
-# Legacy aliases for channel-based blacklist
-load_blacklist = load_channel_blacklist
-save_blacklist = save_channel_blacklist
@@ -0,0 +1,189 @@
+import os
+import asyncio
+import inspect
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Union
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Natural key(s) used by the cogs to index each collection.
+KEY_FIELDS: Dict[str, tuple] = {
+    "profiles": ("user_id",),
+    "autoproxy": ("user_id",),
+    "blacklists": ("guild_id",),
+    "webhooks": ("guild_id", "channel_id"),
+    "alters": ("user_id",),
+}
+
+# Error codes meaning "change streams are not available on this deployment".
+_UNSUPPORTED_CODES = {40573, 40324, 136}
+
+Handler = Callable[[Optional[Hashable], Optional[Dict[str, Any]]], Union[None, Awaitable[None]]]
+
+
+class CacheCoherence:
+    """Keep per-instance caches in sync with MongoDB across bot instances.
+
+    Handlers subscribed with :meth:`subscribe` are called as
+    ``handler(key, doc)`` for every change seen on a collection:
+
+    * ``key`` is the natural key (``user_id``, ``guild_id`` or
+      ``(guild_id, channel_id)`` for webhooks) and ``doc`` the current
+      document, or None if it was deleted.
+    * ``key`` None means the change could not be attributed to one entry
+      and the whole cache for that collection should be dropped.
+
+    Change streams are used when the deployment supports them (replica set
+    or Atlas). Otherwise the collection is polled every ``poll_interval``
+    seconds for documents with a newer ``updated_at``, and a full
+    invalidation is issued every ``ttl`` seconds to catch deletions.
+    Collections are passed in, so any object exposing Motor's ``watch()``
+    and ``find()`` can stand in for a real server.
+    """
+
+    def __init__(self, poll_interval: Optional[float] = None, ttl: Optional[float] = None):
+        self.poll_interval = poll_interval or float(os.getenv("CACHE_POLL_INTERVAL", 30))
+        self.ttl = ttl or float(os.getenv("CACHE_TTL", 300))
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._modes: Dict[str, str] = {}
+        self._id_keys: Dict[str, Dict[Any, Hashable]] = {}
+        self.events_applied = 0
+        self.full_invalidations = 0
+
+    def subscribe(self, collection: str, handler: Handler) -> None:
+        handlers = self._handlers.setdefault(collection, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    def unsubscribe(self, collection: str, handler: Handler) -> None:
+        handlers = self._handlers.get(collection, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def start(self, collections: Dict[str, Any]) -> None:
+        """Start one watcher task per collection. Must run inside the event loop."""
+        for name, collection in collections.items():
+            if collection is None or name in self._tasks:
+                continue
+            self._id_keys.setdefault(name, {})
+            self._tasks[name] = asyncio.create_task(self._watch(name, collection))
+        logger.info(f"🔁 Cache coherence started for: {', '.join(self._tasks) or 'nothing'}")
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "modes": dict(self._modes),
+            "events_applied": self.events_applied,
+            "full_invalidations": self.full_invalidations,
+        }
+
+    # -- Dispatch -------------------------------------------------------------
+
+    def _key_for(self, name: str, doc: Dict[str, Any]) -> Optional[Hashable]:
+        fields = KEY_FIELDS.get(name, ("_id",))
+        values = tuple(doc.get(f) for f in fields)
+        if any(v is None for v in values):
+            return None
+        return values[0] if len(values) == 1 else values
+
+    async def _emit(self, name: str, key: Optional[Hashable], doc: Optional[Dict[str, Any]]) -> None:
+        if key is None:
+            self.full_invalidations += 1
+        else:
+            self.events_applied += 1
+        for handler in list(self._handlers.get(name, [])):
+            try:
+                result = handler(key, doc)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.error(f"Cache handler {handler!r} failed on {name}:{key}", exc_info=True)
+
+    async def _apply_change(self, name: str, change: Dict[str, Any]) -> None:
+        op = change.get("operationType")
+        id_keys = self._id_keys[name]
+        doc_id = (change.get("documentKey") or {}).get("_id")
+        if op in ("insert", "update", "replace"):
+            doc = change.get("fullDocument")
+            if doc is None:
+                # Deleted before the lookup ran; treat as a delete.
+                key = id_keys.pop(doc_id, None)
+                await self._emit(name, key, None)
+                return
+            key = self._key_for(name, doc)
+            if doc_id is not None and key is not None:
+                id_keys[doc_id] = key
+            await self._emit(name, key, doc)
+        elif op == "delete":
+            await self._emit(name, id_keys.pop(doc_id, None), None)
+        else:
+            # drop / rename / dropDatabase / invalidate
+            id_keys.clear()
+            await self._emit(name, None, None)
+
+    # -- Watchers -------------------------------------------------------------
+
+    async def _watch(self, name: str, collection: Any) -> None:
+        resume_token = None
+        backoff = 1.0
+        while True:
+            try:
+                self._modes[name] = "change_stream"
+                async with collection.watch(full_document="updateLookup", resume_after=resume_token) as stream:
+                    backoff = 1.0
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        await self._apply_change(name, change)
+                # Stream closed (invalidate event); start fresh.
+                resume_token = None
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in _UNSUPPORTED_CODES or "replica set" in str(e).lower():
+                    logger.info(f"Change streams unavailable for {name}; falling back to TTL polling.")
+                    await self._poll(name, collection)
+                    return
+                logger.warning(f"Change stream on {name} failed: {e}")
+                resume_token = None
+                await self._emit(name, None, None)
+            except PyMongoError as e:
+                logger.warning(f"Change stream on {name} interrupted: {e}")
+                if resume_token is None:
+                    await self._emit(name, None, None)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    async def _poll(self, name: str, collection: Any) -> None:
+        self._modes[name] = "polling"
+        since = datetime.utcnow().isoformat()
+        last_full = asyncio.get_running_loop().time()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            now = asyncio.get_running_loop().time()
+            if now - last_full >= self.ttl:
+                last_full = now
+                since = datetime.utcnow().isoformat()
+                await self._emit(name, None, None)
+                continue
+            try:
+                newest = since
+                async for doc in collection.find({"updated_at": {"$gt": since}}):
+                    newest = max(newest, doc.get("updated_at") or newest)
+                    await self._emit(name, self._key_for(name, doc), doc)
+                since = newest
+            except PyMongoError as e:
+                logger.warning(f"Polling {name} failed: {e}")
+
+
+# Global instance
+coherence = CacheCoherence()
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class OrderedDispatcher:
+    """Run coroutines concurrently while keeping calls that share a key in order.
+
+    Calls with the same key (e.g. ``(channel_id, author_id)``) are serialised
+    in arrival order; calls with different keys run in parallel, bounded by a
+    global ``max_concurrency`` cap.
+    """
+
+    def __init__(self, max_concurrency: int = 32):
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._pending: Dict[Hashable, int] = {}
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def run(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Run ``func(*args, **kwargs)`` once every earlier call for ``key`` has finished."""
+        # Register synchronously so callers reach the key lock in arrival order.
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._pending[key] = self._pending.get(key, 0) + 1
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        started = False
+        try:
+            async with lock:
+                async with self._semaphore:
+                    started = True
+                    self.queued -= 1
+                    self.in_flight += 1
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception:
+                        self.failed += 1
+                        raise
+                    finally:
+                        self.in_flight -= 1
+                        self.completed += 1
+        finally:
+            if not started:
+                self.queued -= 1
+            self._pending[key] -= 1
+            if self._pending[key] <= 0:
+                del self._pending[key]
+                self._locks.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Return a snapshot of queue depth and throughput counters."""
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queue_depth": self.max_queue_depth,
+            "active_keys": len(self._locks),
+            "max_concurrency": self.max_concurrency,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
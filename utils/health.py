@@ -0,0 +1,96 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from utils.mongodb import db
+from utils.metrics import loop_lag
+from utils.startup import startup
+
+logger = logging.getLogger(__name__)
+
+# Seconds between MongoDB pings.
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", 5))
+# Loop lag (seconds) above which the instance stops taking traffic.
+HEALTH_MAX_LOOP_LAG = float(os.getenv("HEALTH_MAX_LOOP_LAG", 1.0))
+# Seconds without a loop-lag sample after which the lag sampler counts as dead.
+HEALTH_LOOP_STALL = float(os.getenv("HEALTH_LOOP_STALL", 10))
+
+
+class HealthMonitor:
+    """Liveness and readiness from state gathered in the background.
+
+    A task on the bot's loop pings MongoDB every ``interval`` seconds and
+    stores the result. :meth:`live` and :meth:`ready` only read that state,
+    the loop-lag sampler and the bot's gateway flag, and do no I/O. They run
+    on the bot's loop like the web server, so a loop that is stuck right now
+    cannot answer a probe at all; the probe's own timeout catches that. What
+    is checked here is lag the loop has recovered from, and a lag sampler
+    that has stopped reporting.
+    """
+
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL):
+        self.interval = interval
+        self.bot = None
+        self.db_latency_ms: Optional[float] = None
+        self.db_checked: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, bot) -> None:
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Health check failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self) -> None:
+        self.db_latency_ms = await db.ping()
+        self.db_checked = time.monotonic()
+
+    def _loop(self) -> Dict[str, Any]:
+        sampled = loop_lag.last_sample
+        age = time.monotonic() - sampled if sampled is not None else None
+        return {
+            "lag_ms": round(loop_lag.last * 1000, 2),
+            "last_sample_age": round(age, 2) if age is not None else None,
+            "sampler_dead": age is not None and age > HEALTH_LOOP_STALL,
+        }
+
+    def live(self) -> Tuple[bool, Dict[str, Any]]:
+        """The process answered, and its loop-lag sampler is still running."""
+        loop = self._loop()
+        return not loop["sampler_dead"], {"loop": loop}
+
+    def ready(self) -> Tuple[bool, Dict[str, Any]]:
+        """The instance can serve: gateway up, MongoDB answering, caches warm, loop lag low."""
+        loop = self._loop()
+        checked_age = time.monotonic() - self.db_checked if self.db_checked is not None else None
+        database = {
+            "ok": self.db_latency_ms is not None and checked_age is not None and checked_age <= 3 * self.interval,
+            "ping_ms": round(self.db_latency_ms, 2) if self.db_latency_ms is not None else None,
+            "checked_age": round(checked_age, 2) if checked_age is not None else None,
+        }
+        checks = {
+            "gateway": bool(self.bot is not None and getattr(self.bot, "gateway_connected", False)),
+            "database": database["ok"],
+            "caches": startup.is_ready("caches"),
+            "loop": not loop["sampler_dead"] and loop["lag_ms"] <= HEALTH_MAX_LOOP_LAG * 1000,
+        }
+        return all(checks.values()), {"checks": checks, "database": database, "loop": loop}
+
+
+# Global instance
+health = HealthMonitor()
@@ -1,6 +1,7 @@
 import re
 import discord
 from utils.mongodb import db
+from utils.alter_index import alter_indexes
 from typing import Optional, Dict, Any
 from datetime import datetime
 
@@ -35,36 +36,14 @@ def is_valid_image_file(file_name: str) -> bool:
 # -- Profile Helpers --------------------------------------------------------
 
 def find_alter_by_name(profile: Dict[str, Any], search_name: str) -> Optional[str]:
-    """Find an alter by name or alias in the given profile, case-insensitive."""
+    """Find an alter by name or alias in the given profile, case-insensitive.
+
+    Exact matches on name, display name or alias win over partial ones;
+    ties go to the alter that comes first in the profile.
+    """
     if not profile or 'alters' not in profile:
         return None
-
-    name_lower = search_name.lower()
-    alters = profile.get('alters', {})
-
-    # Exact match on name, displayname, or aliases
-    for name, data in alters.items():
-        if name.lower() == name_lower:
-            return name
-        displayname = data.get('displayname') or ''
-        if displayname.lower() == name_lower:
-            return name
-        aliases = data.get('aliases') or []
-        if any(alias.lower() == name_lower for alias in aliases if alias):
-            return name
-
-    # Partial match
-    for name, data in alters.items():
-        if name_lower in name.lower():
-            return name
-        displayname = data.get('displayname') or ''
-        if name_lower in displayname.lower():
-            return name
-        aliases = data.get('aliases') or []
-        if any(name_lower in alias.lower() for alias in aliases if alias):
-            return name
-
-    return None
+    return alter_indexes.get(profile).find(search_name)
 
 # -- Embed & Formatting -----------------------------------------------------
 
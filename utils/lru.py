@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """Bounded LRU cache whose fills can't outlive an invalidation.
+
+    A value built from a read that raced with a write must not be cached
+    after that write's :meth:`invalidate`. Take a :meth:`token` before the
+    read and pass it to :meth:`put`; the put is skipped if the key (or the
+    whole cache) was invalidated in between.
+
+    Invalidations are stamped with a counter. Only the latest ``max_size``
+    stamps are kept; dropping an older one raises the floor below which
+    tokens are refused, so a forgotten invalidation errs towards not caching.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def token(self) -> int:
+        """Take before reading the data a value is built from."""
+        return self._clock
+
+    def put(self, key: Hashable, value: Any, token: Optional[int] = None) -> bool:
+        """Cache ``value``; returns False if ``token`` predates an invalidation of ``key``."""
+        if token is not None and (token < self._floor or self._invalidated.get(key, 0) > token):
+            return False
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return True
+
+    def invalidate(self, key: Hashable, doc: Optional[Dict[str, Any]] = None) -> None:
+        """Drop ``key``. Takes ``doc`` so it can be used as a db listener directly."""
+        self._entries.pop(key, None)
+        self._clock += 1
+        self._invalidated[key] = self._clock
+        self._invalidated.move_to_end(key)
+        while len(self._invalidated) > self.max_size:
+            _, self._floor = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._invalidated.clear()
+        self._clock += 1
+        self._floor = self._clock
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "max_size": self.max_size}
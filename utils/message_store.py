@@ -0,0 +1,202 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from utils.mongodb import db
+from utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ProxiedMessage:
+    """Who sent a proxied webhook message, as which alter, and through which webhook."""
+
+    __slots__ = ("message_id", "original_author", "alter_name", "channel_id", "guild_id",
+                 "original_id", "webhook_id", "created")
+
+    def __init__(self, message_id: int, original_author: int, alter_name: str,
+                 channel_id: int, guild_id: int, original_id: Optional[int] = None,
+                 webhook_id: Optional[int] = None, created: Optional[float] = None):
+        self.message_id = message_id
+        self.original_author = original_author
+        self.alter_name = alter_name
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.original_id = original_id
+        self.webhook_id = webhook_id
+        self.created = created if created is not None else time.time()
+
+    def to_doc(self) -> Dict[str, Any]:
+        return {
+            "message_id": self.message_id,
+            "original_author": self.original_author,
+            "alter_name": self.alter_name,
+            "channel_id": self.channel_id,
+            "guild_id": self.guild_id,
+            "original_id": self.original_id,
+            "webhook_id": self.webhook_id,
+            "created_at": datetime.utcfromtimestamp(self.created),
+        }
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "ProxiedMessage":
+        created = doc.get("created_at")
+        return cls(
+            doc["message_id"], doc["original_author"], doc.get("alter_name"),
+            doc.get("channel_id"), doc.get("guild_id"), doc.get("original_id"), doc.get("webhook_id"),
+            (created - datetime(1970, 1, 1)).total_seconds() if isinstance(created, datetime) else None,
+        )
+
+
+class ProxiedMessageStore:
+    """Proxied-message log: a bounded in-memory index over the ``proxied_messages`` collection.
+
+    Recent entries are kept in memory, keyed by webhook message id, and
+    dropped once there are more than ``max_size`` of them or they are older
+    than ``max_age`` seconds. With ``persist`` enabled every entry is also
+    written to MongoDB, in batches of up to ``batch_size`` at most
+    ``flush_interval`` seconds after it was added. The collection expires
+    entries through a TTL index. :meth:`lookup` and :meth:`last_for` fall
+    back to it on a memory miss, so edits and deletes keep working across
+    restarts and instances.
+    """
+
+    def __init__(self, max_size: int = 10000, max_age: float = 21600, persist: bool = True,
+                 batch_size: int = 100, flush_interval: float = 2.0):
+        self.max_size = max(1, max_size)
+        self.max_age = max_age
+        self.persist = persist
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._entries: "OrderedDict[int, ProxiedMessage]" = OrderedDict()
+        self._latest: Dict[Tuple[int, int], int] = {}
+        self._pending: "OrderedDict[int, ProxiedMessage]" = OrderedDict()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, message_id: int) -> bool:
+        return self.get(message_id) is not None
+
+    def add(self, record: ProxiedMessage) -> None:
+        self._entries[record.message_id] = record
+        self._entries.move_to_end(record.message_id)
+        self._latest[(record.original_author, record.channel_id)] = record.message_id
+        self._evict()
+        if self.persist:
+            self._pending[record.message_id] = record
+            self._schedule_flush()
+
+    def get(self, message_id: int) -> Optional[ProxiedMessage]:
+        """Return the in-memory record for ``message_id`` if still within limits."""
+        record = self._entries.get(message_id)
+        if record is not None and time.time() - record.created > self.max_age:
+            self._evict()
+            return None
+        return record
+
+    async def lookup(self, message_id: int) -> Optional[ProxiedMessage]:
+        """Like :meth:`get`, but also checks MongoDB."""
+        record = self.get(message_id) or self._pending.get(message_id)
+        record_cache("proxied_messages", record is not None)
+        if record is not None or not self.persist:
+            return record
+        doc = await db.get_proxied_message(message_id)
+        return ProxiedMessage.from_doc(doc) if doc else None
+
+    async def last_for(self, author_id: int, channel_id: int) -> Optional[ProxiedMessage]:
+        """Return the most recent message ``author_id`` proxied in ``channel_id``."""
+        message_id = self._latest.get((author_id, channel_id))
+        record = self.get(message_id) if message_id is not None else None
+        if record is not None or not self.persist:
+            return record
+        doc = await db.get_last_proxied_message(author_id, channel_id)
+        return ProxiedMessage.from_doc(doc) if doc else None
+
+    async def remove(self, message_id: int) -> None:
+        """Forget ``message_id`` (its webhook message was deleted or replaced)."""
+        record = self._entries.pop(message_id, None)
+        if record is not None and self._latest.get((record.original_author, record.channel_id)) == message_id:
+            del self._latest[(record.original_author, record.channel_id)]
+        if self._pending.pop(message_id, None) is not None or not self.persist:
+            return  # never written
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        # Wait out an in-flight insert of this record, or it would land after the delete.
+        async with self._flush_lock:
+            self._pending.pop(message_id, None)  # re-queued by a failed flush
+            await db.delete_proxied_message(message_id)
+
+    def _evict(self) -> None:
+        cutoff = time.time() - self.max_age
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if len(self._entries) <= self.max_size and oldest.created >= cutoff:
+                break
+            self._entries.popitem(last=False)
+            key = (oldest.original_author, oldest.channel_id)
+            if self._latest.get(key) == oldest.message_id:
+                del self._latest[key]
+
+    def _schedule_flush(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """Flush while anything is pending. A single task, so flushes are never cancelled midway."""
+        while self._pending:
+            if len(self._pending) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            if not await self.flush():
+                await asyncio.sleep(self.flush_interval)  # back off while MongoDB is unhappy
+
+    async def flush(self) -> bool:
+        """Write pending entries to MongoDB; returns False if they were re-queued.
+
+        Flushes are serialised, and a batch whose write did not complete
+        (error or cancellation) goes back in front of newer entries.
+        """
+        if not self.persist or not self._pending:
+            return True
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch = list(self._pending.values())
+            self._pending.clear()
+            saved = False
+            try:
+                await db.save_proxied_messages([record.to_doc() for record in batch])
+                saved = True
+            except Exception as e:
+                logger.error(f"❌ Failed to save {len(batch)} proxied messages: {e}")
+            finally:
+                if not saved:
+                    requeued = OrderedDict((record.message_id, record) for record in batch)
+                    requeued.update(self._pending)
+                    self._pending = requeued
+            return saved
+
+    async def close(self) -> None:
+        """Stop the background flusher and write whatever is still pending."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "max_size": self.max_size, "pending": len(self._pending)}
@@ -1,31 +1,126 @@
 # utils/mongodb.py
 
 import os
+import re
+import time
+import uuid
+import asyncio
+import inspect
+import functools
+import random
 import logging
 import ssl
 import certifi
 from datetime import datetime
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
 from pymongo.server_api import ServerApi
-from pymongo.database import Database
-from pymongo.collection import Collection
-from typing import Optional, Dict, Any, List
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+from typing import Optional, Dict, Any, List, Callable, Iterable, Tuple
+
+from utils.proxy_matcher import parse_proxy_pattern
+from utils.alter_index import COLLECTION_LAYOUT, alter_indexes
+from utils.metrics import metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Attempts update_profile makes before giving up on a contended profile.
+PROFILE_CAS_RETRIES = 5
+
+# Write-behind buffer: seconds between flushes, and queued writes that force an early one.
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", 1.0))
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", 500))
+
+# Fields on ``alters`` documents that are bookkeeping rather than alter data.
+ALTER_META_FIELDS = frozenset((
+    "_id", "user_id", "name", "position", "name_lower", "displayname_lower", "aliases_lower", "proxy_prefix",
+    "updated_at",
+))
+
+
+MONGO_OP_SECONDS = metrics.histogram("pixel_mongo_op_seconds", "Latency of MongoDB data-layer calls.", ["method"])
+MONGO_OP_ERRORS = metrics.counter("pixel_mongo_op_errors_total", "MongoDB data-layer calls that raised.", ["method"])
+
+
+class VersionConflict(Exception):
+    """A profile kept changing underneath a compare-and-swap update."""
+
+
+def _derived_alter_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Indexed lookup fields computed from an alter's data."""
+    derived = {
+        "displayname_lower": (data.get("displayname") or "").lower(),
+        "aliases_lower": [a.lower() for a in data.get("aliases") or [] if a],
+    }
+    prefix, _ = parse_proxy_pattern(data.get("proxy"))
+    derived["proxy_prefix"] = prefix
+    return derived
+
+
+def alter_to_doc(user_id: str, name: str, data: Dict[str, Any], position: int) -> Dict[str, Any]:
+    doc = {k: v for k, v in data.items() if k not in ALTER_META_FIELDS}
+    doc.setdefault("alter_id", str(uuid.uuid4())[:8])
+    doc.update(_derived_alter_fields(doc))
+    doc.update({"user_id": user_id, "name": name, "name_lower": name.lower(), "position": position,
+                "updated_at": datetime.utcnow().isoformat()})
+    return doc
+
+
+def alter_from_doc(doc: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    return doc["name"], {k: v for k, v in doc.items() if k not in ALTER_META_FIELDS}
+
+
+def _timed(method: str, func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            MONGO_OP_ERRORS.inc(method=method)
+            raise
+        finally:
+            MONGO_OP_SECONDS.observe(time.perf_counter() - start, method=method)
+    return wrapper
+
+
+def _timed_methods(cls):
+    """Record the latency of every public coroutine method of ``cls``, labelled by method name."""
+    for name, func in list(vars(cls).items()):
+        if not name.startswith("_") and inspect.iscoroutinefunction(func):
+            setattr(cls, name, _timed(name, func))
+    return cls
+
+
+@_timed_methods
 class MongoDB:
+    """Async (Motor) data layer. Every data method is a coroutine and must be awaited."""
+
     def __init__(self):
-        self.client: Optional[MongoClient] = None
-        self.db: Optional[Database] = None
-        self.profiles: Optional[Collection] = None
-        self.autoproxy: Optional[Collection] = None
-        self.blacklists: Optional[Collection] = None
-        self.switches: Optional[Collection] = None
-        self.webhooks: Optional[Collection] = None
-
-    def connect(self) -> None:
-        """Connect to MongoDB using the URI from the environment variable."""
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.profiles: Optional[AsyncIOMotorCollection] = None
+        self.autoproxy: Optional[AsyncIOMotorCollection] = None
+        self.blacklists: Optional[AsyncIOMotorCollection] = None
+        self.switches: Optional[AsyncIOMotorCollection] = None
+        self.webhooks: Optional[AsyncIOMotorCollection] = None
+        self.proxied_messages: Optional[AsyncIOMotorCollection] = None
+        self.alters: Optional[AsyncIOMotorCollection] = None
+        self._write_behind = WriteBehind(self)
+        self._listeners: Dict[str, List[Callable[[str, Optional[Dict[str, Any]]], Any]]] = {}
+
+    async def connect(
+        self,
+        max_pool_size: Optional[int] = None,
+        min_pool_size: Optional[int] = None,
+        max_idle_time_ms: Optional[int] = None,
+    ) -> None:
+        """Connect to MongoDB using the URI from the environment variable.
+
+        Pool sizing falls back to MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE
+        and MONGODB_MAX_IDLE_TIME_MS when not passed explicitly.
+        """
         if self.client is not None and self.db is not None:
             return  # already connected
 
@@ -39,16 +134,19 @@ class MongoDB:
 
         try:
             tls_ca = certifi.where()
-            client = MongoClient(
+            client = AsyncIOMotorClient(
                 uri,
                 server_api=ServerApi("1"),
                 serverSelectionTimeoutMS=10000,
+                maxPoolSize=max_pool_size or int(os.getenv("MONGODB_MAX_POOL_SIZE", 100)),
+                minPoolSize=min_pool_size or int(os.getenv("MONGODB_MIN_POOL_SIZE", 0)),
+                maxIdleTimeMS=max_idle_time_ms or int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", 60000)),
                 tls=True,
                 tlsCAFile=tls_ca,
                 tlsAllowInvalidCertificates=True,
                 tlsAllowInvalidHostnames=True
             )
-            client.admin.command("ping")
+            await client.admin.command("ping")
             logger.info("✅ Successfully pinged MongoDB admin database.")
         except Exception as e:
             logger.error("❌ Failed to connect to MongoDB:", exc_info=True)
@@ -66,85 +164,767 @@ class MongoDB:
         self.blacklists = self.db["blacklists"]
         self.switches   = self.db["switches"]
         self.webhooks   = self.db["webhooks"]
+        self.proxied_messages = self.db["proxied_messages"]
+        self.alters     = self.db["alters"]
 
         # Ensure indexes
-        self.profiles.create_index("user_id",   unique=True)
-        self.autoproxy.create_index("user_id",  unique=True)
-        self.blacklists.create_index("guild_id",unique=True)
-        self.webhooks.create_index([("channel_id",1),("guild_id",1)], unique=True)
+        await self.profiles.create_index("user_id",   unique=True)
+        await self.autoproxy.create_index("user_id",  unique=True)
+        await self.blacklists.create_index("guild_id",unique=True)
+        await self.webhooks.create_index([("channel_id",1),("guild_id",1)], unique=True)
+        await self.proxied_messages.create_index("message_id", unique=True)
+        await self.proxied_messages.create_index([("original_author",1),("channel_id",1),("created_at",-1)])
+        await self.alters.create_index([("user_id",1),("alter_id",1)], unique=True)
+        await self.alters.create_index([("user_id",1),("name",1)], unique=True)
+        await self.alters.create_index([("user_id",1),("name_lower",1)])
+        await self.alters.create_index([("user_id",1),("aliases_lower",1)])
+        await self.alters.create_index([("user_id",1),("proxy_prefix",1)], sparse=True)
+        # Polled on updated_at when change streams are unavailable (see utils/cache_sync.py)
+        for polled in (self.profiles, self.autoproxy, self.blacklists, self.webhooks, self.alters):
+            await polled.create_index("updated_at")
+        await self.proxied_messages.create_index(
+            "created_at",
+            expireAfterSeconds=int(os.getenv("PROXIED_MESSAGE_TTL_DAYS", 30)) * 86400
+        )
+        try:
+            await self._init_switches(int(os.getenv("SWITCH_RETENTION_DAYS", 0)) * 86400)
+        except OperationFailure as e:
+            logger.warning(f"⚠️ Could not apply switches collection options: {e}")
         logger.info("📌 MongoDB collections and indexes initialized.")
 
-    def get_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+    async def _init_switches(self, retention: int) -> None:
+        """Create ``switches`` as a time-series collection and apply the retention policy.
+
+        ``retention`` is in seconds; 0 keeps history forever. An existing
+        plain collection (or a server without time-series support) keeps
+        working with a ``(user_id, timestamp)`` index and a TTL index.
+        """
+        info = (await self.db.command("listCollections", filter={"name": "switches"}))["cursor"]["firstBatch"]
+        if not info:
+            options: Dict[str, Any] = {"timeseries": {"timeField": "timestamp", "metaField": "user_id", "granularity": "minutes"}}
+            if retention:
+                options["expireAfterSeconds"] = retention
+            try:
+                await self.db.create_collection("switches", **options)
+                info = [{"type": "timeseries"}]
+                logger.info("🕒 Created switches as a time-series collection.")
+            except OperationFailure as e:
+                logger.info(f"Time-series collections unavailable ({e}); using a plain switches collection.")
+                info = [{"type": "collection"}]
+        await self.switches.create_index([("user_id", 1), ("timestamp", -1)])
+
+        if info[0].get("type") == "timeseries":
+            await self.db.command({"collMod": "switches", "expireAfterSeconds": retention or "off"})
+            return
+        if retention:
+            try:
+                await self.switches.create_index("timestamp", name="timestamp_ttl", expireAfterSeconds=retention)
+            except OperationFailure:
+                # Index exists with a different expiry; change it in place.
+                await self.db.command({"collMod": "switches", "index": {"name": "timestamp_ttl", "expireAfterSeconds": retention}})
+        else:
+            try:
+                await self.switches.drop_index("timestamp_ttl")
+            except OperationFailure:
+                pass
+
+    def add_listener(self, collection: str, callback: Callable[[str, Optional[Dict[str, Any]]], Any]) -> None:
+        """Register ``callback(key, doc)`` to run after this instance writes to ``collection``.
+
+        ``key`` is the document's natural key (``user_id`` for profiles,
+        ``guild_id`` for blacklists). ``doc`` is the document as written, an
+        empty dict when only part of it changed (listeners should drop
+        cached state and reload lazily), or None when it was deleted.
+        """
+        callbacks = self._listeners.setdefault(collection, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    def remove_listener(self, collection: str, callback: Callable[[str, Optional[Dict[str, Any]]], Any]) -> None:
+        callbacks = self._listeners.get(collection, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def _notify(self, collection: str, key: str, doc: Optional[Dict[str, Any]]) -> None:
+        for callback in list(self._listeners.get(collection, [])):
+            try:
+                callback(key, doc)
+            except Exception:
+                logger.error(f"{collection} listener {callback!r} failed for {key}", exc_info=True)
+
+    async def ping(self) -> Optional[float]:
+        """Round-trip a ``ping`` command; returns the latency in milliseconds, or None if it failed."""
+        if self.client is None or self.db is None:
+            return None
+        start = time.perf_counter()
+        try:
+            await self.client.admin.command("ping")
+        except PyMongoError as e:
+            logger.warning(f"⚠️ MongoDB ping failed: {e}")
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    def close(self) -> None:
+        """Close the client and release pooled connections.
+
+        Await :meth:`flush_writes` first; buffered writes are dropped here.
+        """
+        self._write_behind.cancel()
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.db = None
+
+    async def get_profile(self, user_id: str, with_alters: bool = True) -> Optional[Dict[str, Any]]:
+        """Return the profile; ``alters`` is assembled from the alters collection if needed.
+
+        With ``with_alters`` False the returned profile has no ``alters`` key,
+        which skips loading (and decoding) them for commands that don't use them.
+        """
         if self.db is None or self.profiles is None:
             logger.warning("Attempted to get_profile but MongoDB is not connected.")
             return None
-        return self.profiles.find_one({"user_id": user_id})
+        projection = None if with_alters else {"alters": 0}
+        profile = await self.profiles.find_one({"user_id": user_id}, projection)
+        if profile is not None and with_alters and profile.get("alters_layout") == COLLECTION_LAYOUT:
+            profile["alters"] = await self._load_alters({"user_id": user_id})
+        return profile
 
-    def save_profile(self, user_id: str, data: Dict[str, Any]) -> None:
+    async def save_profile(self, user_id: str, data: Dict[str, Any]) -> None:
+        """Unconditionally overwrite the profile's fields (bumps ``version``).
+
+        Prefer :meth:`update_profile` or the partial-update methods below when
+        the write depends on what was read.
+        """
         if self.db is None or self.profiles is None:
             logger.warning("Attempted to save_profile but MongoDB is not connected.")
             return
         data["updated_at"] = datetime.utcnow().isoformat()
-        self.profiles.update_one(
+        fields = {k: v for k, v in data.items() if k not in ("_id", "version", "alters_layout")}
+        if "alters" in fields and await self._alters_layout(user_id) == COLLECTION_LAYOUT:
+            await self._replace_alters(user_id, fields.pop("alters") or {})
+        await self.profiles.update_one(
             {"user_id": user_id},
-            {"$set": data},
+            {"$set": fields, "$inc": {"version": 1}},
             upsert=True
         )
+        self._notify("profiles", user_id, data)
+
+    async def _cas_save_profile(self, user_id: str, profile: Dict[str, Any], version: int) -> bool:
+        """Write ``profile`` only if the stored version is still ``version``."""
+        fields = {k: v for k, v in profile.items() if k not in ("_id", "version", "alters_layout")}
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        fields["version"] = version + 1
+        alters = None
+        if profile.get("alters_layout") == COLLECTION_LAYOUT:
+            alters = fields.pop("alters", None)
+        if version:
+            result = await self.profiles.update_one({"user_id": user_id, "version": version}, {"$set": fields})
+            if result.matched_count and alters is not None:
+                await self._replace_alters(user_id, alters)
+            return result.matched_count > 0
+        # Version 0: the profile is missing or predates versioning.
+        try:
+            await self.profiles.update_one(
+                {"user_id": user_id, "version": {"$exists": False}},
+                {"$set": fields},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False  # someone else created or versioned it first
+        return True
 
-    def delete_profile(self, user_id: str) -> None:
+    async def update_profile(
+        self,
+        user_id: str,
+        mutate: Callable[[Dict[str, Any]], Optional[bool]],
+        create: bool = False,
+        retries: int = PROFILE_CAS_RETRIES,
+    ) -> Optional[Dict[str, Any]]:
+        """Read-modify-write a profile with compare-and-swap on its ``version``.
+
+        ``mutate`` edits the profile in place; returning False aborts without
+        writing. On a concurrent write the profile is re-read and ``mutate``
+        re-applied, up to ``retries`` times, before :class:`VersionConflict`
+        is raised. Returns the saved profile, or None if it was missing (and
+        ``create`` is False) or ``mutate`` aborted.
+        """
+        if self.db is None or self.profiles is None:
+            logger.warning("Attempted to update_profile but MongoDB is not connected.")
+            return None
+        for attempt in range(retries):
+            profile = await self.get_profile(user_id)
+            if profile is None:
+                if not create:
+                    return None
+                profile = {"user_id": user_id, "system": {}, "alters": {}, "folders": {}}
+            version = profile.get("version", 0)
+            if mutate(profile) is False:
+                return None
+            if await self._cas_save_profile(user_id, profile, version):
+                profile["version"] = version + 1
+                self._notify("profiles", user_id, profile)
+                return profile
+            await asyncio.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+        raise VersionConflict(f"Profile {user_id} changed concurrently {retries} times; giving up.")
+
+    async def delete_profile(self, user_id: str) -> None:
         if self.db is None or self.profiles is None or self.autoproxy is None:
             logger.warning("Attempted to delete_profile but MongoDB is not connected.")
             return
-        self.profiles.delete_one({"user_id": user_id})
-        self.autoproxy.delete_one({"user_id": user_id})
+        await self.profiles.delete_one({"user_id": user_id})
+        await self.autoproxy.delete_one({"user_id": user_id})
+        if self.alters is not None:
+            await self.alters.delete_many({"user_id": user_id})
+        self._notify("profiles", user_id, None)
+
+    # -- Alters collection ---------------------------------------------------
+    # Profiles migrated to the collection layout keep one document per alter
+    # in ``alters`` so that lookups and edits touch a single small document.
+
+    async def _alters_layout(self, user_id: str) -> Optional[str]:
+        """Return the profile's alters layout, or None if it has no profile."""
+        profile = await self.profiles.find_one({"user_id": user_id}, {"alters_layout": 1})
+        if profile is None:
+            return None
+        return profile.get("alters_layout", "embedded")
+
+    async def _load_alters(self, query: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        alters: Dict[str, Dict[str, Any]] = {}
+        async for doc in self.alters.find(query).sort("position", 1):
+            name, data = alter_from_doc(doc)
+            alters[name] = data
+        return alters
+
+    async def _replace_alters(self, user_id: str, alters: Dict[str, Dict[str, Any]]) -> None:
+        """Make the user's alter documents match ``alters`` exactly, in order.
+
+        Documents are upserted by ``alter_id``, so a renamed alter is renamed
+        in place, and stale ones are only deleted once the write succeeded.
+        """
+        docs, seen = [], set()
+        for position, (name, data) in enumerate(alters.items()):
+            if data.get("alter_id") in seen:  # alter_id must be unique per user
+                data = {k: v for k, v in data.items() if k != "alter_id"}
+            doc = alter_to_doc(user_id, name, data, position)
+            seen.add(doc["alter_id"])
+            docs.append(doc)
+        # A name still held by a different alter_id (swapped or reused) has
+        # to be freed before the upsert can take it.
+        incoming = {doc["name"]: doc["alter_id"] for doc in docs}
+        displaced = [
+            doc["name"] async for doc in self.alters.find({"user_id": user_id, "name": {"$in": list(incoming)}}, {"name": 1, "alter_id": 1})
+            if doc.get("alter_id") != incoming[doc["name"]]
+        ]
+        removed = 0
+        if displaced:
+            removed += (await self.alters.delete_many({"user_id": user_id, "name": {"$in": displaced}})).deleted_count
+        if docs:
+            await self.alters.bulk_write([
+                ReplaceOne({"user_id": user_id, "alter_id": doc["alter_id"]}, doc, upsert=True) for doc in docs
+            ], ordered=False)
+        removed += (await self.alters.delete_many({"user_id": user_id, "alter_id": {"$nin": list(seen)}})).deleted_count
+        if removed:
+            await self._touch_profile(user_id)
+
+    async def find_alter(self, user_id: str, query: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Find one alter by name, display name or alias, like ``find_alter_by_name``.
+
+        Exact (case-insensitive) matches win over partial ones; ties go to
+        the alter that comes first in the profile. Returns (name, data).
+        """
+        return (await self.find_alters(user_id, [query])).get(query)
+
+    async def find_alters(self, user_id: str, queries: Iterable[str]) -> Dict[str, Optional[Tuple[str, Dict[str, Any]]]]:
+        """Resolve several queries like :meth:`find_alter`, reading the profile once."""
+        queries = list(queries)
+        if self.db is None or self.profiles is None:
+            logger.warning("Attempted to find_alters but MongoDB is not connected.")
+            return {}
+        profile = await self.profiles.find_one({"user_id": user_id})
+        if profile is None:
+            return {query: None for query in queries}
+        if profile.get("alters_layout") == COLLECTION_LAYOUT:
+            if len(queries) == 1:
+                return {queries[0]: await self._find_alter_doc(user_id, queries[0])}
+            profile["alters"] = await self._load_alters({"user_id": user_id})
+        alters = profile.get("alters") or {}
+        index = alter_indexes.get(profile)
+        found = {}
+        for query in queries:
+            name = index.find(query)
+            found[query] = (name, alters[name]) if name else None
+        return found
+
+    async def _find_alter_doc(self, user_id: str, query: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """One indexed lookup in the alters collection, ranked like :class:`AlterIndex`."""
+        lowered = query.lower()
+        exact = {"user_id": user_id, "$or": [
+            {"name_lower": lowered}, {"displayname_lower": lowered}, {"aliases_lower": lowered},
+        ]}
+        doc = await self.alters.find_one(exact, sort=[("position", 1)])
+        if doc is None:
+            pattern = {"$regex": re.escape(lowered)}
+            doc = await self.alters.find_one({"user_id": user_id, "$or": [
+                {"name_lower": pattern}, {"displayname_lower": pattern}, {"aliases_lower": pattern},
+            ]}, sort=[("position", 1)])
+        return alter_from_doc(doc) if doc else None
+
+    async def get_alters(self, user_id: str, names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the named alters that exist, in profile order."""
+        names = list(names)
+        if self.db is None or self.profiles is None:
+            logger.warning("Attempted to get_alters but MongoDB is not connected.")
+            return {}
+        if await self._alters_layout(user_id) == COLLECTION_LAYOUT:
+            return await self._load_alters({"user_id": user_id, "name": {"$in": names}})
+        profile = await self.profiles.find_one(
+            {"user_id": user_id}, {f"alters.{n}": 1 for n in names if self._path_safe(n)} or None
+        )
+        alters = (profile or {}).get("alters") or {}
+        return {n: alters[n] for n in alters if n in names}
+
+    async def migrate_profile_alters(self, user_id: str, retries: int = PROFILE_CAS_RETRIES) -> bool:
+        """Move one profile's embedded alters into the alters collection.
+
+        The alter documents are written first; the profile is then switched
+        to the collection layout with a compare-and-swap on its version, so
+        an edit that lands mid-migration makes it start over instead of
+        being lost. Returns True once the profile uses the collection layout.
+        """
+        if self.db is None or self.profiles is None or self.alters is None:
+            logger.warning("Attempted to migrate alters but MongoDB is not connected.")
+            return False
+        for attempt in range(retries):
+            profile = await self.profiles.find_one({"user_id": user_id})
+            if profile is None:
+                return False
+            if profile.get("alters_layout") == COLLECTION_LAYOUT:
+                return True
+            await self._replace_alters(user_id, profile.get("alters") or {})
+
+            version = profile.get("version", 0)
+            query = {"user_id": user_id, "version": version} if version else {"user_id": user_id, "version": {"$exists": False}}
+            result = await self.profiles.update_one(query, {
+                "$set": {"alters_layout": COLLECTION_LAYOUT, "version": version + 1,
+                         "updated_at": datetime.utcnow().isoformat()},
+                "$unset": {"alters": ""},
+            })
+            if result.matched_count:
+                self._notify("profiles", user_id, {})
+                return True
+            await asyncio.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+        logger.warning(f"Gave up migrating alters for {user_id}; profile kept changing.")
+        return False
+
+    async def migrate_all_alters(self, batch_size: int = 100, pause: float = 1.0) -> int:
+        """Migrate every embedded profile in batches, pausing between them.
+
+        Safe to run while the bot is serving traffic and to interrupt;
+        already-migrated profiles are skipped. Returns how many were moved.
+        """
+        if self.db is None or self.profiles is None:
+            logger.warning("Attempted to migrate alters but MongoDB is not connected.")
+            return 0
+        migrated = 0
+        while True:
+            cursor = self.profiles.find(
+                {"alters_layout": {"$ne": COLLECTION_LAYOUT}}, {"user_id": 1}
+            ).limit(batch_size)
+            user_ids = [doc["user_id"] async for doc in cursor]
+            if not user_ids:
+                break
+            progressed = False
+            for user_id in user_ids:
+                if await self.migrate_profile_alters(user_id):
+                    migrated += 1
+                    progressed = True
+            if not progressed:
+                break
+            logger.info(f"📦 Migrated alters for {migrated} profiles so far...")
+            await asyncio.sleep(pause)
+        logger.info(f"✅ Alters migration finished: {migrated} profiles moved.")
+        return migrated
+
+    # -- Partial profile updates ---------------------------------------------
+    # Targeted atomic operators instead of rewriting the whole document.
+    # Names that cannot be used in a dotted path (containing "." or starting
+    # with "$") fall back to a read-modify-write of the profile.
+
+    @staticmethod
+    def _path_safe(*keys: str) -> bool:
+        return all(k and "." not in k and not k.startswith("$") for k in keys)
+
+    async def _update_profile(
+        self,
+        user_id: str,
+        update: Dict[str, Any],
+        fallback: Callable[[Dict[str, Any]], None],
+        keys: tuple = (),
+        upsert: bool = False,
+        filter_extra: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        if self.db is None or self.profiles is None:
+            logger.warning("Attempted to update profile but MongoDB is not connected.")
+            return False
+        if not self._path_safe(*keys):
+            def mutate(profile):
+                try:
+                    fallback(profile)
+                except KeyError:
+                    return False
+            return await self.update_profile(user_id, mutate, create=upsert) is not None
+        update.setdefault("$set", {})["updated_at"] = datetime.utcnow().isoformat()
+        update.setdefault("$inc", {})["version"] = 1
+        query = {"user_id": user_id, **(filter_extra or {})}
+        try:
+            result = await self.profiles.update_one(query, update, upsert=upsert)
+        except DuplicateKeyError:
+            return False  # upsert filter didn't match an existing profile
+        self._notify("profiles", user_id, {})
+        return result.matched_count > 0 or result.upserted_id is not None
+
+    async def _route_alter_update(self, user_id: str, embedded: Callable[[], Any], collection: Callable[[], Any]) -> bool:
+        """Run an alter write against whichever layout the profile uses.
+
+        The embedded write goes first, guarded on the profile not being
+        migrated; only when it matches nothing is the layout read, so
+        embedded profiles need no extra round trip and a migration racing
+        with the write sends it to the collection instead.
+        """
+        if await embedded():
+            return True
+        if await self._alters_layout(user_id) == COLLECTION_LAYOUT:
+            return await collection()
+        return False
+
+    async def _touch_profile(self, user_id: str) -> None:
+        """Bump the profile's ``updated_at`` so polling caches see a removed alter."""
+        await self.profiles.update_one({"user_id": user_id}, {"$set": {"updated_at": datetime.utcnow().isoformat()}})
+
+    async def _update_alter_doc(self, user_id: str, alter: str, update: Any) -> bool:
+        stamp = {"updated_at": datetime.utcnow().isoformat()}
+        if isinstance(update, list):
+            update = [*update, {"$set": stamp}]  # aggregation pipeline
+        else:
+            update = {**update, "$set": {**update.get("$set", {}), **stamp}}
+        result = await self.alters.update_one({"user_id": user_id, "name": alter}, update)
+        if result.matched_count:
+            self._notify("profiles", user_id, {})
+        return result.matched_count > 0
+
+    async def set_alter(self, user_id: str, alter: str, data: Dict[str, Any], overwrite: bool = True) -> bool:
+        """Create or replace one alter, creating the profile if needed.
+
+        With ``overwrite`` False, returns False instead of replacing an
+        existing alter of the same name.
+        """
+        def fallback(p):
+            alters = p.setdefault("alters", {})
+            if not overwrite and alter in alters:
+                raise KeyError(alter)
+            alters[alter] = data
+
+        async def embedded():
+            extra = {"alters_layout": {"$ne": COLLECTION_LAYOUT}}
+            if not overwrite and self._path_safe(alter):
+                extra[f"alters.{alter}"] = {"$exists": False}
+            return await self._update_profile(
+                user_id,
+                {"$set": {f"alters.{alter}": data}, "$setOnInsert": {"system": {}, "folders": {}}},
+                fallback,
+                keys=(alter,), upsert=True,
+                filter_extra=extra,
+            )
+
+        async def collection():
+            query = {"user_id": user_id, "name": alter}
+            existing = await self.alters.find_one(query, {"position": 1}) if overwrite else None
+            position = existing["position"] if existing else time.time_ns() // 1000
+            doc = alter_to_doc(user_id, alter, data, position)
+            try:
+                if overwrite:
+                    await self.alters.replace_one(query, doc, upsert=True)
+                else:
+                    result = await self.alters.update_one(query, {"$setOnInsert": doc}, upsert=True)
+                    if result.upserted_id is None:
+                        return False
+            except DuplicateKeyError:
+                return False
+            self._notify("profiles", user_id, {})
+            return True
+
+        return await self._route_alter_update(user_id, embedded, collection)
+
+    async def remove_alter(self, user_id: str, alter: str) -> bool:
+        async def embedded():
+            return await self._update_profile(
+                user_id,
+                {"$unset": {f"alters.{alter}": ""}},
+                lambda p: p.get("alters", {}).pop(alter, None),
+                keys=(alter,),
+                filter_extra={"alters_layout": {"$ne": COLLECTION_LAYOUT}},
+            )
+
+        async def collection():
+            result = await self.alters.delete_one({"user_id": user_id, "name": alter})
+            if result.deleted_count:
+                await self._touch_profile(user_id)
+            self._notify("profiles", user_id, {})
+            return result.deleted_count > 0
+
+        return await self._route_alter_update(user_id, embedded, collection)
+
+    async def update_alter_field(self, user_id: str, alter: str, field: str, value: Any) -> bool:
+        """Set a single field on one alter, e.g. its proxy tag or avatar."""
+        async def embedded():
+            extra = {"alters_layout": {"$ne": COLLECTION_LAYOUT}}
+            if self._path_safe(alter):
+                extra[f"alters.{alter}"] = {"$exists": True}
+            return await self._update_profile(
+                user_id,
+                {"$set": {f"alters.{alter}.{field}": value}},
+                lambda p: p["alters"][alter].__setitem__(field, value),
+                keys=(alter, field),
+                filter_extra=extra,
+            )
 
-    def get_autoproxy(self, key: str) -> Dict[str, Any]:
+        async def collection():
+            fields = {field: value}
+            if field in ("displayname", "aliases", "proxy"):
+                fields.update({k: v for k, v in _derived_alter_fields(fields).items() if field in k})
+            return await self._update_alter_doc(user_id, alter, {"$set": fields})
+
+        return await self._route_alter_update(user_id, embedded, collection)
+
+    async def unset_alter_field(self, user_id: str, alter: str, field: str) -> bool:
+        async def embedded():
+            return await self._update_profile(
+                user_id,
+                {"$unset": {f"alters.{alter}.{field}": ""}},
+                lambda p: p["alters"][alter].pop(field, None),
+                keys=(alter, field),
+                filter_extra={"alters_layout": {"$ne": COLLECTION_LAYOUT}},
+            )
+
+        async def collection():
+            update: Dict[str, Any] = {"$unset": {field: ""}}
+            if field == "proxy":
+                update["$set"] = {"proxy_prefix": None}
+            return await self._update_alter_doc(user_id, alter, update)
+
+        return await self._route_alter_update(user_id, embedded, collection)
+
+    @staticmethod
+    def _aliases_pipeline(aliases_expr: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Update pipeline that sets ``aliases`` and recomputes ``aliases_lower``."""
+        return [
+            {"$set": {"aliases": aliases_expr}},
+            {"$set": {"aliases_lower": {"$map": {"input": "$aliases", "in": {"$toLower": "$$this"}}}}},
+        ]
+
+    async def add_alias(self, user_id: str, alter: str, alias: str) -> bool:
+        def fallback(p):
+            aliases = p["alters"][alter].setdefault("aliases", [])
+            if alias not in aliases:
+                aliases.append(alias)
+
+        async def embedded():
+            return await self._update_profile(
+                user_id,
+                {"$addToSet": {f"alters.{alter}.aliases": alias}},
+                fallback,
+                keys=(alter,),
+                filter_extra={"alters_layout": {"$ne": COLLECTION_LAYOUT}},
+            )
+
+        async def collection():
+            current = {"$ifNull": ["$aliases", []]}
+            return await self._update_alter_doc(user_id, alter, self._aliases_pipeline(
+                {"$cond": [{"$in": [alias, current]}, current, {"$concatArrays": [current, [alias]]}]}
+            ))
+
+        return await self._route_alter_update(user_id, embedded, collection)
+
+    async def remove_alias(self, user_id: str, alter: str, alias: str) -> bool:
+        def fallback(p):
+            aliases = p["alters"][alter].get("aliases") or []
+            if alias in aliases:
+                aliases.remove(alias)
+
+        async def embedded():
+            return await self._update_profile(
+                user_id,
+                {"$pull": {f"alters.{alter}.aliases": alias}},
+                fallback,
+                keys=(alter,),
+                filter_extra={"alters_layout": {"$ne": COLLECTION_LAYOUT}},
+            )
+
+        async def collection():
+            return await self._update_alter_doc(user_id, alter, self._aliases_pipeline(
+                {"$filter": {"input": {"$ifNull": ["$aliases", []]}, "cond": {"$ne": ["$$this", alias]}}}
+            ))
+
+        return await self._route_alter_update(user_id, embedded, collection)
+
+    async def update_system_field(self, user_id: str, field: str, value: Any) -> bool:
+        return await self._update_profile(
+            user_id,
+            {"$set": {f"system.{field}": value}},
+            lambda p: p.setdefault("system", {}).__setitem__(field, value),
+            keys=(field,),
+        )
+
+    async def set_folder(self, user_id: str, folder: str, data: Dict[str, Any], overwrite: bool = True) -> bool:
+        """Create or replace one folder, creating the profile if needed.
+
+        With ``overwrite`` False, returns False instead of replacing an
+        existing folder of the same name.
+        """
+        def fallback(p):
+            folders = p.setdefault("folders", {})
+            if not overwrite and folder in folders:
+                raise KeyError(folder)
+            folders[folder] = data
+        return await self._update_profile(
+            user_id,
+            {"$set": {f"folders.{folder}": data}, "$setOnInsert": {"system": {}, "alters": {}}},
+            fallback,
+            keys=(folder,), upsert=True,
+            filter_extra=None if overwrite or not self._path_safe(folder) else {f"folders.{folder}": {"$exists": False}},
+        )
+
+    async def remove_folder(self, user_id: str, folder: str) -> bool:
+        return await self._update_profile(
+            user_id,
+            {"$unset": {f"folders.{folder}": ""}},
+            lambda p: p.get("folders", {}).pop(folder, None),
+            keys=(folder,),
+        )
+
+    async def rename_folder(self, user_id: str, old: str, new: str) -> bool:
+        def fallback(p):
+            folders = p.setdefault("folders", {})
+            folders[new] = folders.pop(old)
+            folders[new]["name"] = new
+        if not self._path_safe(old, new):
+            return await self._update_profile(user_id, {}, fallback, keys=(old, new))
+        renamed = await self._update_profile(
+            user_id, {"$rename": {f"folders.{old}": f"folders.{new}"}}, fallback, keys=(old, new),
+            filter_extra={f"folders.{old}": {"$exists": True}, f"folders.{new}": {"$exists": False}},
+        )
+        if renamed:
+            await self.update_folder_field(user_id, new, "name", new)
+        return renamed
+
+    async def update_folder_field(self, user_id: str, folder: str, field: str, value: Any) -> bool:
+        return await self._update_profile(
+            user_id,
+            {"$set": {f"folders.{folder}.{field}": value}},
+            lambda p: p["folders"][folder].__setitem__(field, value),
+            keys=(folder, field),
+            filter_extra={f"folders.{folder}": {"$exists": True}} if self._path_safe(folder) else None,
+        )
+
+    async def add_folder_members(self, user_id: str, folder: str, alters: List[str]) -> bool:
+        def fallback(p):
+            members = p["folders"][folder].setdefault("alters", [])
+            members.extend(a for a in alters if a not in members)
+        return await self._update_profile(
+            user_id,
+            {"$addToSet": {f"folders.{folder}.alters": {"$each": list(alters)}}},
+            fallback,
+            keys=(folder,),
+        )
+
+    async def remove_folder_members(self, user_id: str, folder: str, alters: List[str]) -> bool:
+        def fallback(p):
+            p["folders"][folder]["alters"] = [a for a in p["folders"][folder].get("alters", []) if a not in alters]
+        return await self._update_profile(
+            user_id,
+            {"$pull": {f"folders.{folder}.alters": {"$in": list(alters)}}},
+            fallback,
+            keys=(folder,),
+        )
+
+    async def clear_folder_members(self, user_id: str, folder: str) -> bool:
+        return await self.update_folder_field(user_id, folder, "alters", [])
+
+    async def get_autoproxy(self, key: str) -> Dict[str, Any]:
         if self.db is None or self.autoproxy is None:
             logger.warning("Attempted to get_autoproxy but MongoDB is not connected.")
             return {"enabled": False, "mode": "off"}
-        doc = self.autoproxy.find_one({"user_id": key})
+        doc = await self.autoproxy.find_one({"user_id": key})
+        pending = self._write_behind.pending_autoproxy(key)
+        if pending:
+            doc = {**(doc or {"user_id": key, "enabled": False, "mode": "off"}), **pending}
         return doc if doc is not None else {"enabled": False, "mode": "off"}
 
-    def save_autoproxy(self, key: str, settings: Dict[str, Any]) -> None:
+    async def save_autoproxy(self, key: str, settings: Dict[str, Any]) -> None:
         if self.db is None or self.autoproxy is None:
             logger.warning("Attempted to save_autoproxy but MongoDB is not connected.")
             return
         settings["updated_at"] = datetime.utcnow().isoformat()
-        self.autoproxy.update_one(
+        # This write supersedes any buffered values for the same fields.
+        self._write_behind.discard_autoproxy(key, settings)
+        await self.autoproxy.update_one(
             {"user_id": key},
             {"$set": settings},
             upsert=True
         )
 
-    def get_blacklist(self, guild_id: str) -> Dict[str, Any]:
+    def queue_autoproxy(self, key: str, fields: Dict[str, Any]) -> None:
+        """Buffer a ``$set`` of ``fields`` on one autoproxy document.
+
+        Used for hot-path updates such as the latch's ``last_alter``. Queued
+        fields for the same key are coalesced (last write wins) and written
+        on the next flush; :meth:`get_autoproxy` already reflects them.
+        """
+        self._write_behind.set_autoproxy(key, fields)
+
+    async def flush_writes(self) -> None:
+        """Write out everything buffered by :meth:`queue_autoproxy` and :meth:`record_switch`."""
+        await self._write_behind.flush()
+
+    async def get_blacklist(self, guild_id: str) -> Dict[str, Any]:
         if self.db is None or self.blacklists is None:
             logger.warning("Attempted to get_blacklist but MongoDB is not connected.")
             return {"channels": [], "categories": []}
-        doc = self.blacklists.find_one({"guild_id": guild_id})
+        doc = await self.blacklists.find_one({"guild_id": guild_id})
         return doc if doc is not None else {"channels": [], "categories": []}
 
-    def save_blacklist(self, guild_id: str, data: Dict[str, Any]) -> None:
+    async def save_blacklist(self, guild_id: str, data: Dict[str, Any]) -> None:
         if self.db is None or self.blacklists is None:
             logger.warning("Attempted to save_blacklist but MongoDB is not connected.")
             return
         data["updated_at"] = datetime.utcnow().isoformat()
-        self.blacklists.update_one(
+        await self.blacklists.update_one(
             {"guild_id": guild_id},
             {"$set": data},
             upsert=True
         )
+        self._notify("blacklists", guild_id, data)
 
-    def get_webhook(self, channel_id: int, guild_id: int) -> Optional[Dict[str, Any]]:
+    async def get_webhook(self, channel_id: int, guild_id: int) -> Optional[Dict[str, Any]]:
         if self.db is None or self.webhooks is None:
             logger.warning("Attempted to get_webhook but MongoDB is not connected.")
             return None
-        return self.webhooks.find_one({"channel_id": channel_id, "guild_id": guild_id})
+        return await self.webhooks.find_one({"channel_id": channel_id, "guild_id": guild_id})
+
+    async def get_webhooks(self, guild_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return every stored webhook, or only those in ``guild_id``."""
+        if self.db is None or self.webhooks is None:
+            logger.warning("Attempted to get_webhooks but MongoDB is not connected.")
+            return []
+        query = {} if guild_id is None else {"guild_id": guild_id}
+        return await self.webhooks.find(query).to_list(length=None)
 
-    def save_webhook(self, channel_id: int, guild_id: int, webhook_id: int, webhook_token: str) -> None:
+    async def save_webhook(self, channel_id: int, guild_id: int, webhook_id: int, webhook_token: str) -> None:
         if self.db is None or self.webhooks is None:
             logger.warning("Attempted to save_webhook but MongoDB is not connected.")
             return
-        self.webhooks.update_one(
+        await self.webhooks.update_one(
             {"channel_id": channel_id, "guild_id": guild_id},
             {"$set": {
                 "webhook_id": webhook_id,
@@ -154,32 +934,315 @@ class MongoDB:
             upsert=True
         )
 
-    def delete_webhook(self, channel_id: int, guild_id: int) -> None:
+    async def add_pool_webhook(self, channel_id: int, guild_id: int, webhook_id: int, webhook_token: str) -> None:
+        """Add an extra webhook to a channel's pool (the first one is saved with :meth:`save_webhook`)."""
+        if self.db is None or self.webhooks is None:
+            logger.warning("Attempted to add_pool_webhook but MongoDB is not connected.")
+            return
+        await self.webhooks.update_one(
+            {"channel_id": channel_id, "guild_id": guild_id},
+            {
+                "$push": {"pool": {"webhook_id": webhook_id, "webhook_token": webhook_token}},
+                "$set": {"updated_at": datetime.utcnow().isoformat()},
+            }
+        )
+
+    async def remove_webhook(self, channel_id: int, guild_id: int, webhook_id: int) -> None:
+        """Remove one webhook from a channel's pool, promoting a pool member if it was the primary."""
+        if self.db is None or self.webhooks is None:
+            logger.warning("Attempted to remove_webhook but MongoDB is not connected.")
+            return
+        query = {"channel_id": channel_id, "guild_id": guild_id}
+        now = datetime.utcnow().isoformat()
+        await self.webhooks.update_one(
+            query, {"$pull": {"pool": {"webhook_id": webhook_id}}, "$set": {"updated_at": now}}
+        )
+        doc = await self.webhooks.find_one({**query, "webhook_id": webhook_id})
+        if doc is None:
+            return
+        pool = doc.get("pool") or []
+        if not pool:
+            await self.webhooks.delete_one({**query, "webhook_id": webhook_id})
+            return
+        await self.webhooks.update_one({**query, "webhook_id": webhook_id}, {
+            "$set": {"webhook_id": pool[0]["webhook_id"], "webhook_token": pool[0]["webhook_token"], "updated_at": now},
+            "$pull": {"pool": {"webhook_id": pool[0]["webhook_id"]}},
+        })
+
+    async def delete_webhook(self, channel_id: int, guild_id: int) -> None:
         if self.db is None or self.webhooks is None:
             logger.warning("Attempted to delete_webhook but MongoDB is not connected.")
             return
-        self.webhooks.delete_one({"channel_id": channel_id, "guild_id": guild_id})
+        await self.webhooks.delete_one({"channel_id": channel_id, "guild_id": guild_id})
 
-    def record_switch(self, user_id: str, alter_id: str) -> None:
+    async def record_switch(self, user_id: str, alter_id: str, timestamp: Optional[datetime] = None) -> None:
         if self.db is None or self.switches is None:
             logger.warning("Attempted to record_switch but MongoDB is not connected.")
             return
-        self.switches.insert_one({
+        # Buffered; inserted in batches by the write-behind flusher.
+        self._write_behind.add_switch({
             "user_id": user_id,
             "alter_id": alter_id,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": timestamp or datetime.utcnow()
         })
 
-    def get_recent_switches(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    async def get_recent_switches(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         if self.db is None or self.switches is None:
             logger.warning("Attempted to get_recent_switches but MongoDB is not connected.")
             return []
-        return list(
+        cursor = (
             self.switches
                 .find({"user_id": user_id})
                 .sort("timestamp", -1)
                 .limit(limit)
         )
+        return await cursor.to_list(length=limit)
+
+    async def get_switches(
+        self,
+        user_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """Return the user's switches with ``start <= timestamp < end``, oldest first."""
+        if self.db is None or self.switches is None:
+            logger.warning("Attempted to get_switches but MongoDB is not connected.")
+            return []
+        window: Dict[str, Any] = {}
+        if start is not None:
+            window["$gte"] = start
+        if end is not None:
+            window["$lt"] = end
+        query: Dict[str, Any] = {"user_id": user_id}
+        if window:
+            query["timestamp"] = window
+        cursor = self.switches.find(query).sort("timestamp", 1).limit(limit)
+        return await cursor.to_list(length=limit or None)
+
+    async def get_front_time(
+        self,
+        user_id: str,
+        start: datetime,
+        end: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """Per-alter time in front between ``start`` and ``end`` (default now).
+
+        Each switch fronts until the next one, clipped to the window; the
+        switch in effect at ``start`` counts from ``start``. Returns
+        ``{"alter_id", "seconds", "switches"}`` dicts, longest first.
+        """
+        if self.db is None or self.switches is None:
+            logger.warning("Attempted to get_front_time but MongoDB is not connected.")
+            return []
+        end = end or datetime.utcnow()
+        previous = await self.switches.find_one(
+            {"user_id": user_id, "timestamp": {"$lt": start}}, sort=[("timestamp", -1)]
+        )
+        since = previous["timestamp"] if previous else start
+        pipeline = [
+            {"$match": {"user_id": user_id, "timestamp": {"$gte": since, "$lt": end}}},
+            {"$setWindowFields": {
+                "partitionBy": "$user_id",
+                "sortBy": {"timestamp": 1},
+                "output": {"until": {"$shift": {"output": "$timestamp", "by": 1, "default": end}}},
+            }},
+            {"$match": {"until": {"$gt": start}}},
+            {"$project": {
+                "alter_id": 1,
+                "ms": {"$subtract": [{"$min": ["$until", end]}, {"$max": ["$timestamp", start]}]},
+            }},
+            {"$group": {"_id": "$alter_id", "ms": {"$sum": "$ms"}, "switches": {"$sum": 1}}},
+            {"$sort": {"ms": -1}},
+        ]
+        return [
+            {"alter_id": row["_id"], "seconds": row["ms"] / 1000, "switches": row["switches"]}
+            async for row in self.switches.aggregate(pipeline)
+        ]
+
+    async def migrate_switch_timestamps(self) -> int:
+        """Convert legacy ISO-string switch timestamps to native datetimes.
+
+        Only plain collections can hold these (time-series ones reject
+        them), and string timestamps neither sort against datetimes nor expire.
+        """
+        if self.db is None or self.switches is None:
+            logger.warning("Attempted to migrate switches but MongoDB is not connected.")
+            return 0
+        try:
+            info = (await self.db.command("listCollections", filter={"name": "switches"}))["cursor"]["firstBatch"]
+            if not info or info[0].get("type") == "timeseries":
+                return 0
+            result = await self.switches.update_many(
+                {"timestamp": {"$type": "string"}},
+                [{"$set": {"timestamp": {"$dateFromString": {"dateString": "$timestamp"}}}}],
+            )
+        except OperationFailure as e:
+            logger.error(f"❌ Failed to migrate switch timestamps: {e}")
+            return 0
+        if result.modified_count:
+            logger.info(f"🕒 Converted {result.modified_count} switch timestamps to dates.")
+        return result.modified_count
+
+    async def save_proxied_messages(self, records: List[Dict[str, Any]]) -> None:
+        if self.db is None or self.proxied_messages is None:
+            logger.warning("Attempted to save_proxied_messages but MongoDB is not connected.")
+            return
+        if not records:
+            return
+        try:
+            await self.proxied_messages.insert_many(records, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate message ids (already saved) are fine; anything else is not.
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+    async def get_proxied_message(self, message_id: int) -> Optional[Dict[str, Any]]:
+        if self.db is None or self.proxied_messages is None:
+            logger.warning("Attempted to get_proxied_message but MongoDB is not connected.")
+            return None
+        return await self.proxied_messages.find_one({"message_id": message_id})
+
+    async def get_last_proxied_message(self, author_id: int, channel_id: int) -> Optional[Dict[str, Any]]:
+        """Return the newest message ``author_id`` proxied in ``channel_id``."""
+        if self.db is None or self.proxied_messages is None:
+            logger.warning("Attempted to get_last_proxied_message but MongoDB is not connected.")
+            return None
+        return await self.proxied_messages.find_one(
+            {"original_author": author_id, "channel_id": channel_id},
+            sort=[("created_at", -1)],
+        )
+
+    async def delete_proxied_message(self, message_id: int) -> None:
+        if self.db is None or self.proxied_messages is None:
+            logger.warning("Attempted to delete_proxied_message but MongoDB is not connected.")
+            return
+        await self.proxied_messages.delete_one({"message_id": message_id})
+
+class WriteBehind:
+    """Coalesces high-frequency writes and flushes them in batches.
+
+    Autoproxy ``$set`` fields are merged per key so only the latest value
+    of each field is written; switch documents are inserted together with
+    ``insert_many``. A flush runs every ``interval`` seconds while anything
+    is queued, or sooner once ``max_batch`` writes are waiting. Writes that
+    fail are re-queued behind anything newer, so they never overwrite it.
+    """
+
+    def __init__(self, mongo: "MongoDB", interval: float = WRITE_BEHIND_INTERVAL, max_batch: int = WRITE_BEHIND_MAX_BATCH):
+        self._mongo = mongo
+        self.interval = interval
+        self.max_batch = max_batch
+        self._autoproxy: Dict[str, Dict[str, Any]] = {}
+        self._switches: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self.flushed = 0
+        self.failures = 0
+
+    def __len__(self) -> int:
+        return len(self._autoproxy) + len(self._switches)
+
+    def pending_autoproxy(self, key: str) -> Dict[str, Any]:
+        return self._autoproxy.get(key, {})
+
+    def discard_autoproxy(self, key: str, fields: Iterable[str]) -> None:
+        pending = self._autoproxy.get(key)
+        if pending:
+            for field in fields:
+                pending.pop(field, None)
+            if not pending:
+                del self._autoproxy[key]
+
+    def set_autoproxy(self, key: str, fields: Dict[str, Any]) -> None:
+        self._autoproxy.setdefault(key, {}).update(fields)
+        self._schedule()
+
+    def add_switch(self, doc: Dict[str, Any]) -> None:
+        self._switches.append(doc)
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._lock = self._lock or asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+        elif len(self) >= self.max_batch:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while len(self):
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not await self.flush():
+                await asyncio.sleep(self.interval)  # back off while MongoDB is unhappy
+
+    def cancel(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def flush(self) -> bool:
+        """Write everything queued so far; returns False if anything was re-queued."""
+        if not len(self):
+            return True
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            autoproxy, self._autoproxy = self._autoproxy, {}
+            switches, self._switches = self._switches, []
+            mongo = self._mongo
+            if mongo.db is None:
+                logger.warning(f"Dropping {len(autoproxy) + len(switches)} buffered writes; MongoDB is not connected.")
+                return True
+            ok = True
+            if autoproxy:
+                now = datetime.utcnow().isoformat()
+                ops = [
+                    UpdateOne({"user_id": key}, {"$set": {**fields, "updated_at": now}}, upsert=True)
+                    for key, fields in autoproxy.items()
+                ]
+                try:
+                    with MONGO_OP_SECONDS.time(method="write_behind_autoproxy"):
+                        await mongo.autoproxy.bulk_write(ops, ordered=False)
+                    self.flushed += len(ops)
+                except PyMongoError as e:
+                    ok = False
+                    self.failures += 1
+                    logger.error(f"❌ Failed to flush {len(ops)} autoproxy updates: {e}")
+                    for key, fields in autoproxy.items():
+                        self._autoproxy[key] = {**fields, **self._autoproxy.get(key, {})}
+            if switches:
+                try:
+                    with MONGO_OP_SECONDS.time(method="write_behind_switches"):
+                        await mongo.switches.insert_many(switches, ordered=False)
+                    self.flushed += len(switches)
+                except BulkWriteError as e:
+                    # Only the documents that failed to insert are retried.
+                    self.failures += 1
+                    logger.error(f"❌ Failed to insert some of {len(switches)} switches: {e}")
+                    failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != 11000}
+                    self._switches[:0] = [doc for i, doc in enumerate(switches) if i in failed]
+                    ok = ok and not failed
+                except PyMongoError as e:
+                    ok = False
+                    self.failures += 1
+                    logger.error(f"❌ Failed to flush {len(switches)} switches: {e}")
+                    self._switches[:0] = switches
+            return ok
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "autoproxy_pending": len(self._autoproxy),
+            "switches_pending": len(self._switches),
+            "flushed": self.flushed,
+            "failures": self.failures,
+        }
 
 # Global instance
 db = MongoDB()
+db.add_listener("profiles", alter_indexes.invalidate)
@@ -0,0 +1,249 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: profile from startup (it can also be switched on at runtime with !pixel_profile on).
+PROFILE_ENABLED = os.getenv("PIXEL_PROFILE", "").lower() in ("1", "true", "yes")
+# A callback that holds the loop longer than this (ms) gets its stack captured.
+PROFILE_SLOW_CALLBACK_MS = float(os.getenv("PROFILE_SLOW_CALLBACK_MS", 100))
+# How many stall captures to keep.
+PROFILE_MAX_STALLS = int(os.getenv("PROFILE_MAX_STALLS", 20))
+# Bearer token for GET /debug/profile; the route is not served without one.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+
+HANDLER_SECONDS = metrics.histogram(
+    "pixel_handler_seconds", "Wall time of profiled command and listener invocations.", ["handler"]
+)
+HANDLER_BLOCKING_SECONDS = metrics.histogram(
+    "pixel_handler_blocking_seconds", "Time profiled handlers held the event loop (ran without awaiting).", ["handler"]
+)
+LOOP_STALLS = metrics.counter("pixel_loop_stalls_total", "Callbacks that held the loop past the slow-callback threshold.")
+
+
+class HandlerStats:
+    __slots__ = ("calls", "errors", "wall", "blocking", "max_wall", "max_blocking", "max_step")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.wall = 0.0
+        self.blocking = 0.0
+        self.max_wall = 0.0
+        self.max_blocking = 0.0
+        self.max_step = 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "wall_ms": round(self.wall * 1000, 2),
+            "blocking_ms": round(self.blocking * 1000, 2),
+            "avg_wall_ms": round(self.wall * 1000 / self.calls, 2) if self.calls else 0.0,
+            "max_wall_ms": round(self.max_wall * 1000, 2),
+            "max_blocking_ms": round(self.max_blocking * 1000, 2),
+            "max_step_ms": round(self.max_step * 1000, 2),
+        }
+
+
+class _Profiled:
+    """Awaitable that drives ``coro`` step by step and times each step.
+
+    A step is one stretch of the coroutine running between awaits, so the
+    sum of the steps is the time it held the loop. Blocking calls (a
+    synchronous pymongo query, CPU-heavy parsing) show up there and not
+    as time spent waiting.
+    """
+
+    __slots__ = ("profiler", "name", "coro", "blocking", "max_step")
+
+    def __init__(self, profiler: "LoopProfiler", name: str, coro):
+        self.profiler = profiler
+        self.name = name
+        self.coro = coro
+        self.blocking = 0.0
+        self.max_step = 0.0
+
+    def _step(self, method, arg):
+        previous, self.profiler.current = self.profiler.current, self.name
+        start = time.perf_counter()
+        try:
+            return method(arg)
+        finally:
+            step = time.perf_counter() - start
+            self.blocking += step
+            self.max_step = max(self.max_step, step)
+            self.profiler.current = previous
+
+    def __await__(self):
+        coro = self.coro
+        method, arg = coro.send, None
+        while True:
+            try:
+                yielded = self._step(method, arg)
+            except StopIteration as e:
+                return e.value
+            try:
+                method, arg = coro.send, (yield yielded)
+            except BaseException as e:  # cancellation included: hand it to the coroutine
+                method, arg = coro.throw, e
+
+
+class LoopProfiler:
+    """Opt-in profiling of command and listener handlers, plus a stall watchdog.
+
+    While enabled, :meth:`run` times each handler it wraps: wall time, and
+    the time it actually held the loop. A watchdog thread pings the loop
+    every ``threshold`` seconds. If a ping goes unanswered for longer than
+    that, the thread captures the loop thread's stack, which shows the
+    code that is blocking it, along with the handler being stepped at the
+    time. Disabled, :meth:`run` just awaits the coroutine.
+    """
+
+    def __init__(self, threshold_ms: float = PROFILE_SLOW_CALLBACK_MS, max_stalls: int = PROFILE_MAX_STALLS):
+        self.enabled = False
+        self.threshold = threshold_ms / 1000
+        self.current: Optional[str] = None
+        self.handlers: Dict[str, HandlerStats] = {}
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=max_stalls)
+        self.since: Optional[float] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stalls_lock = threading.Lock()
+
+    # -- Control ------------------------------------------------------------
+
+    def enable(self) -> None:
+        """Start profiling. Must be called from the event loop thread."""
+        if self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()  # fresh per run, so a stopping watchdog can't be revived
+        self._watchdog = threading.Thread(target=self._watch, args=(self._stop,), name="loop-stall-watchdog", daemon=True)
+        self._watchdog.start()
+        self.enabled = True
+        self.since = time.time()
+        logger.info(f"🔬 Loop profiler enabled (slow callback threshold {self.threshold * 1000:.0f}ms)")
+
+    def disable(self) -> None:
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        self._watchdog = None
+        logger.info("🔬 Loop profiler disabled")
+
+    def reset(self) -> None:
+        self.handlers.clear()
+        with self._stalls_lock:
+            self.stalls.clear()
+        self.since = time.time() if self.enabled else None
+
+    # -- Handlers -----------------------------------------------------------
+
+    async def run(self, name: str, coro: Awaitable) -> Any:
+        """Await ``coro``, recording it under ``name`` while profiling is enabled."""
+        if not self.enabled:
+            return await coro
+        profiled = _Profiled(self, name, coro)
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await profiled
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(name, time.perf_counter() - start, profiled, failed)
+
+    def wrap(self, func: Callable[..., Awaitable], name: str) -> Callable[..., Awaitable]:
+        """Return a coroutine function that calls ``func`` through :meth:`run`."""
+        async def wrapper(*args, **kwargs):
+            return await self.run(name, func(*args, **kwargs))
+        return wrapper
+
+    def _record(self, name: str, wall: float, profiled: _Profiled, failed: bool) -> None:
+        stats = self.handlers.get(name)
+        if stats is None:
+            stats = self.handlers[name] = HandlerStats()
+        stats.calls += 1
+        stats.errors += failed
+        stats.wall += wall
+        stats.blocking += profiled.blocking
+        stats.max_wall = max(stats.max_wall, wall)
+        stats.max_blocking = max(stats.max_blocking, profiled.blocking)
+        stats.max_step = max(stats.max_step, profiled.max_step)
+        HANDLER_SECONDS.observe(wall, handler=name)
+        HANDLER_BLOCKING_SECONDS.observe(profiled.blocking, handler=name)
+
+    # -- Stall watchdog (runs in its own thread) ----------------------------
+
+    def _watch(self, stop: threading.Event) -> None:
+        loop = self._loop
+        while not stop.is_set():
+            pong = threading.Event()
+            sent = time.monotonic()
+            try:
+                loop.call_soon_threadsafe(pong.set)
+            except RuntimeError:
+                return  # loop closed
+            if not pong.wait(self.threshold):
+                stall = self._capture(sent)
+                while not pong.wait(self.threshold) and not stop.is_set():
+                    pass
+                if stall is not None:
+                    stall["duration_ms"] = round((time.monotonic() - sent) * 1000, 1)
+                    LOOP_STALLS.inc()
+                    logger.warning(f"🐢 Event loop blocked for {stall['duration_ms']:.0f}ms in {stall['handler'] or 'unknown handler'}")
+            stop.wait(self.threshold)
+
+    def _capture(self, sent: float) -> Optional[Dict[str, Any]]:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return None
+        stall = {
+            "at": time.time(),
+            "handler": self.current,
+            "duration_ms": None,
+            "stack": traceback.format_stack(frame),
+        }
+        with self._stalls_lock:
+            self.stalls.append(stall)
+        return stall
+
+    # -- Reporting ----------------------------------------------------------
+
+    def top(self, limit: int = 10, key: str = "blocking") -> List[Dict[str, Any]]:
+        """Handlers sorted by total ``key`` time ("blocking" or "wall"), worst first."""
+        ranked = sorted(self.handlers.items(), key=lambda kv: getattr(kv[1], key), reverse=True)[:limit]
+        return [{"handler": name, **stats.to_dict()} for name, stats in ranked]
+
+    def recent_stalls(self) -> List[Dict[str, Any]]:
+        """Captured stalls, newest first."""
+        with self._stalls_lock:
+            return [dict(stall) for stall in reversed(self.stalls)]
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "since": self.since,
+            "threshold_ms": self.threshold * 1000,
+            "handlers": self.top(limit),
+            "stalls": self.recent_stalls(),
+        }
+
+
+# Global instance
+profiler = LoopProfiler()
@@ -0,0 +1,128 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.lru import LRUCache
+
+
+def parse_proxy_pattern(pattern: str) -> Tuple[Optional[str], Optional[str]]:
+    """Split a proxy tag such as ``[TEXT]`` or ``a:`` into (prefix, suffix)."""
+    if not pattern:
+        return None, None
+    if pattern.endswith("None"):
+        pattern = pattern.replace("None", "")
+    if "TEXT" in pattern:
+        pre, suf = pattern.split("TEXT", 1)
+        return (pre or None, suf or None)
+    if ":" in pattern.lower():
+        parts = pattern.split(":", 1)
+        return (f"{parts[0]}:", None)
+    return (pattern.strip(), None)
+
+
+def extract_message_content(content: str, prefix: Optional[str], suffix: Optional[str]) -> str:
+    """Strip the proxy prefix/suffix (and surrounding whitespace) from a message."""
+    if prefix:
+        content = content[len(prefix):].lstrip()
+    if suffix:
+        content = content[:-len(suffix)].rstrip()
+    return content
+
+
+class ProxyEntry:
+    __slots__ = ("order", "name", "prefix", "suffix", "data")
+
+    def __init__(self, order: int, name: str, prefix: Optional[str], suffix: Optional[str], data: Dict[str, Any]):
+        self.order = order
+        self.name = name
+        self.prefix = prefix
+        self.suffix = suffix
+        self.data = data
+
+    def matches(self, content: str) -> bool:
+        if self.prefix and not content.startswith(self.prefix):
+            return False
+        if self.suffix and not content.endswith(self.suffix):
+            return False
+        return bool(extract_message_content(content, self.prefix, self.suffix).strip())
+
+
+class ProxyMatcher:
+    """Precompiled proxy-tag index for one user's profile.
+
+    Prefixed tags live in a character trie, suffix-only tags in a set keyed
+    by suffix length, so a message that cannot match is rejected after a
+    handful of dict lookups. When several tags match, the alter that comes
+    first in the profile wins, same as the old linear scan.
+    """
+
+    __slots__ = ("alters", "system", "entries", "_trie", "_suffixes", "_suffix_lengths", "_bare")
+
+    def __init__(self, profile: Optional[Dict[str, Any]]):
+        profile = profile or {}
+        self.alters: Dict[str, Dict[str, Any]] = profile.get("alters") or {}
+        self.system: Dict[str, Any] = profile.get("system") or {}
+        self.entries: List[ProxyEntry] = []
+        self._trie: Dict[str, Any] = {}
+        self._suffixes: Dict[str, List[ProxyEntry]] = {}
+        self._suffix_lengths: List[int] = []
+        self._bare: List[ProxyEntry] = []
+
+        for order, (name, data) in enumerate(self.alters.items()):
+            tag = data.get("proxy")
+            if not tag:
+                continue
+            prefix, suffix = parse_proxy_pattern(tag)
+            entry = ProxyEntry(order, name, prefix, suffix, data)
+            self.entries.append(entry)
+            if prefix:
+                node = self._trie
+                for ch in prefix:
+                    node = node.setdefault(ch, {})
+                node.setdefault(None, []).append(entry)
+            elif suffix:
+                self._suffixes.setdefault(suffix, []).append(entry)
+            else:
+                self._bare.append(entry)
+        self._suffix_lengths = sorted({len(s) for s in self._suffixes})
+
+    def __bool__(self) -> bool:
+        return bool(self.entries)
+
+    def _candidates(self, content: str) -> List[ProxyEntry]:
+        found: List[ProxyEntry] = list(self._bare)
+        node = self._trie
+        for ch in content:
+            node = node.get(ch)
+            if node is None:
+                break
+            found.extend(node.get(None, ()))
+        for length in self._suffix_lengths:
+            if length > len(content):
+                break
+            found.extend(self._suffixes.get(content[-length:], ()))
+        return found
+
+    def match(self, content: str) -> Optional[ProxyEntry]:
+        """Return the first alter (in profile order) whose tag matches ``content``."""
+        if not self.entries or not content:
+            return None
+        for entry in sorted(self._candidates(content), key=lambda e: e.order):
+            if entry.matches(content):
+                return entry
+        return None
+
+
+# Shared matcher for authors without a profile, so they cost one cache slot and no compiled index.
+NO_PROFILE = ProxyMatcher(None)
+
+
+class MatcherCache(LRUCache):
+    """Per-user :class:`ProxyMatcher` cache, bounded LRU.
+
+    Every author who speaks in a guild gets an entry (authors without a
+    profile share :data:`NO_PROFILE`), so the cache is capped at
+    ``max_size`` users and the least recently used fall out.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        super().__init__(max_size or int(os.getenv("PROXY_MATCHER_CACHE_SIZE", 10000)))
@@ -0,0 +1,87 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from discord.ext import commands
+
+logger = logging.getLogger(__name__)
+
+# How long a command or proxied message waits for a startup stage before giving up.
+STARTUP_GATE_TIMEOUT = float(os.getenv("STARTUP_GATE_TIMEOUT", 15))
+
+
+class StartupPending(commands.CheckFailure):
+    """A command arrived before the stage it depends on finished starting."""
+
+
+class StartupTracker:
+    """Named startup stages with timings and readiness events.
+
+    Stages are timed with :meth:`phase`, or with :meth:`begin` and
+    :meth:`mark` when they start and end in different places. Callers that
+    depend on a stage await :meth:`wait_ready`. Offsets are seconds since
+    the tracker was created, which is at import.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._begun: Dict[str, float] = {}
+        self._done: Dict[str, float] = {}
+        self._events: Dict[str, asyncio.Event] = {}
+
+    def _event(self, stage: str) -> asyncio.Event:
+        if stage not in self._events:
+            self._events[stage] = asyncio.Event()
+            if stage in self._done:
+                self._events[stage].set()
+        return self._events[stage]
+
+    def begin(self, stage: str) -> None:
+        self._begun[stage] = time.monotonic()
+
+    @asynccontextmanager
+    async def phase(self, stage: str) -> AsyncIterator[None]:
+        """Time ``stage``; it is marked ready only if the block completes."""
+        self.begin(stage)
+        yield
+        self.mark(stage)
+
+    def mark(self, stage: str) -> None:
+        now = time.monotonic()
+        self._begun.setdefault(stage, now)
+        self._done[stage] = now
+        if stage in self._events:
+            self._events[stage].set()
+        logger.info(f"🚀 Startup stage '{stage}' ready after {now - self.started:.2f}s "
+                    f"(took {now - self._begun[stage]:.2f}s)")
+
+    def is_ready(self, stage: str) -> bool:
+        return stage in self._done
+
+    async def wait_ready(self, stage: str, timeout: Optional[float] = STARTUP_GATE_TIMEOUT) -> bool:
+        """Wait for ``stage``; returns False if it is still pending after ``timeout``."""
+        if stage in self._done:
+            return True
+        try:
+            await asyncio.wait_for(self._event(stage).wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def timings(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Per stage: when it finished (seconds since start) and how long it took."""
+        result = {}
+        for stage, begun in self._begun.items():
+            done = self._done.get(stage)
+            result[stage] = {
+                "ready_at": round(done - self.started, 3) if done is not None else None,
+                "duration": round((done if done is not None else time.monotonic()) - begun, 3),
+            }
+        return result
+
+
+# Global instance
+startup = StartupTracker()
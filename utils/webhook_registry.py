@@ -0,0 +1,359 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import aiohttp
+import discord
+
+from utils.mongodb import db
+
+logger = logging.getLogger(__name__)
+
+WebhookKey = Tuple[int, int]  # (guild_id, channel_id), same as cache_sync's webhooks key
+Target = Union[discord.Guild, discord.abc.GuildChannel]
+
+_WEBHOOK_URL = re.compile(r"/webhooks/(\d+)/")
+# Webhooks created this close to a validation snapshot are never evicted by
+# it: they may postdate the snapshot, and clocks differ a little from Discord's.
+_SNAPSHOT_SLACK = timedelta(seconds=30)
+
+
+class WebhookUsage:
+    """Send bookkeeping for one webhook, which is also its rate-limit bucket."""
+
+    __slots__ = ("last_used", "in_flight", "blocked_until", "sends", "rate_limited")
+
+    def __init__(self):
+        self.last_used = 0.0
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.sends = 0
+        self.rate_limited = 0
+
+
+class WebhookRegistry:
+    """Channel → proxy webhook pool, preloaded from the ``webhooks`` collection.
+
+    Each channel normally has one webhook. With ``pool_size`` above 1
+    (PROXY_WEBHOOK_POOL_SIZE), :meth:`wants_more` asks the cog to create
+    another one whenever every webhook in the pool is mid-send or
+    rate-limited, up to ``pool_size``. :meth:`get` picks the least recently
+    used webhook whose bucket isn't exhausted. Bucket state comes from the
+    rate-limit headers of every webhook response, via :meth:`trace_config`.
+
+    Entries are trusted until something says otherwise: a failed send
+    (the cog calls :meth:`evict`), a ``webhooks_update`` or channel/guild
+    event, or a validation pass. Validation lists a whole guild's (or one
+    channel's) webhooks in a single REST call instead of fetching each
+    webhook, and runs from a queue that spaces calls ``spacing`` seconds
+    apart, backs off on 429s, and yields while ``busy()`` reports proxy
+    traffic in flight. Every guild is re-queued every ``revalidate_every``
+    seconds as a safety net.
+    """
+
+    def __init__(
+        self,
+        session: Callable[[], Awaitable[aiohttp.ClientSession]],
+        busy: Optional[Callable[[], bool]] = None,
+        spacing: Optional[float] = None,
+        cooldown: Optional[float] = None,
+        revalidate_every: Optional[float] = None,
+        pool_size: Optional[int] = None,
+    ):
+        self._session = session
+        self._busy = busy or (lambda: False)
+        self.spacing = spacing or float(os.getenv("WEBHOOK_VALIDATE_SPACING", 2))
+        self.cooldown = cooldown or float(os.getenv("WEBHOOK_VALIDATE_COOLDOWN", 300))
+        self.revalidate_every = revalidate_every or float(os.getenv("WEBHOOK_REVALIDATE_HOURS", 6)) * 3600
+        self.pool_size = max(1, pool_size or int(os.getenv("PROXY_WEBHOOK_POOL_SIZE", 1)))
+        self._hooks: Dict[WebhookKey, List[discord.Webhook]] = {}
+        self._usage: Dict[int, WebhookUsage] = {}
+        self._pool_caps: Dict[WebhookKey, int] = {}
+        self._locks: Dict[WebhookKey, asyncio.Lock] = {}
+        self._queue: "OrderedDict[int, Tuple[Target, bool]]" = OrderedDict()
+        self._validated: Dict[int, float] = {}
+        self._worker: Optional[asyncio.Task] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self._get_guild: Optional[Callable[[int], Optional[discord.Guild]]] = None
+        self.stats_counters = {"sends": 0, "validations": 0, "evicted": 0, "rate_limited": 0, "validation_rate_limited": 0, "skipped": 0}
+
+    def __len__(self) -> int:
+        return sum(len(pool) for pool in self._hooks.values())
+
+    def __contains__(self, key: WebhookKey) -> bool:
+        """Whether ``key`` has a cached webhook. Unlike :meth:`get`, leaves LRU state alone."""
+        return bool(self._hooks.get(key))
+
+    # -- Entries --------------------------------------------------------------
+
+    async def _partial(self, webhook_id: int, token: str) -> discord.Webhook:
+        return discord.Webhook.partial(webhook_id, token, session=await self._session())
+
+    async def preload(self, get_guild: Callable[[int], Optional[discord.Guild]]) -> None:
+        """Load every stored webhook and start the periodic re-validation."""
+        self._get_guild = get_guild
+        loaded = {}
+        for doc in await db.get_webhooks():
+            loaded[(doc['guild_id'], doc['channel_id'])] = await self._pool_from_doc(doc)
+        loaded.update(self._hooks)  # anything created meanwhile is newer
+        self._hooks = loaded
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep())
+        logger.info(f"🪝 Preloaded webhooks for {len(loaded)} channels")
+
+    async def _pool_from_doc(self, doc: Dict[str, Any]) -> List[discord.Webhook]:
+        members = [{"webhook_id": doc['webhook_id'], "webhook_token": doc['webhook_token']}] + (doc.get('pool') or [])
+        return [await self._partial(m['webhook_id'], m['webhook_token']) for m in members]
+
+    def usage(self, webhook_id: int) -> WebhookUsage:
+        if webhook_id not in self._usage:
+            self._usage[webhook_id] = WebhookUsage()
+        return self._usage[webhook_id]
+
+    def get(self, key: WebhookKey) -> Optional[discord.Webhook]:
+        """Pick a webhook for ``key``: least recently used among those not rate-limited."""
+        pool = self._hooks.get(key)
+        if not pool:
+            return None
+        now = time.monotonic()
+        ready = [w for w in pool if self.usage(w.id).blocked_until <= now]
+        if ready:
+            webhook = min(ready, key=lambda w: (self.usage(w.id).in_flight, self.usage(w.id).last_used))
+        else:
+            webhook = min(pool, key=lambda w: self.usage(w.id).blocked_until)
+        self.usage(webhook.id).last_used = now
+        return webhook
+
+    def wants_more(self, key: WebhookKey) -> bool:
+        """True if the pool for ``key`` may grow and every member is busy or rate-limited."""
+        pool = self._hooks.get(key) or []
+        if len(pool) >= min(self.pool_size, self._pool_caps.get(key, self.pool_size)):
+            return False
+        now = time.monotonic()
+        return all(self.usage(w.id).in_flight or self.usage(w.id).blocked_until > now for w in pool)
+
+    def cap_pool(self, key: WebhookKey) -> None:
+        """Stop growing ``key``'s pool (e.g. the channel hit Discord's webhook limit)."""
+        self._pool_caps[key] = len(self._hooks.get(key) or [])
+
+    @asynccontextmanager
+    async def sending(self, webhook: discord.Webhook) -> AsyncIterator[None]:
+        usage = self.usage(webhook.id)
+        usage.in_flight += 1
+        usage.sends += 1
+        self.stats_counters["sends"] += 1
+        try:
+            yield
+        finally:
+            usage.in_flight -= 1
+
+    def lock(self, key: WebhookKey) -> asyncio.Lock:
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    async def add(self, key: WebhookKey, webhook_id: int, token: str) -> discord.Webhook:
+        """Add a webhook to ``key``'s pool, bound to the registry's traced session."""
+        pool = self._hooks.setdefault(key, [])
+        for webhook in pool:
+            if webhook.id == webhook_id:
+                return webhook
+        webhook = await self._partial(webhook_id, token)
+        pool.append(webhook)
+        return webhook
+
+    async def load(self, key: WebhookKey) -> Optional[discord.Webhook]:
+        """Return the stored webhook for ``key`` from MongoDB, caching it."""
+        data = await db.get_webhook(key[1], key[0])
+        if not data:
+            return None
+        self._hooks[key] = await self._pool_from_doc(data)
+        return self.get(key)
+
+    async def find(self, key: WebhookKey, webhook_id: int) -> Optional[discord.Webhook]:
+        """Return the pool member of ``key`` with id ``webhook_id`` (e.g. to edit a message it sent)."""
+        if not any(w.id == webhook_id for w in self._hooks.get(key) or []):
+            await self.load(key)
+        for webhook in self._hooks.get(key) or []:
+            if webhook.id == webhook_id:
+                return webhook
+        return None
+
+    def drop(self, key: WebhookKey) -> None:
+        """Forget ``key`` in memory only (e.g. the channel is hidden from the bot)."""
+        for webhook in self._hooks.pop(key, []):
+            self._usage.pop(webhook.id, None)
+        self._locks.pop(key, None)
+        self._pool_caps.pop(key, None)
+
+    async def evict(self, key: WebhookKey, webhook_id: Optional[int] = None) -> None:
+        """Forget a webhook Discord no longer has, here and in MongoDB.
+
+        With ``webhook_id``, only that member of the pool is evicted, so
+        the rest (or a replacement created concurrently) is left alone.
+        """
+        if webhook_id is None:
+            self.drop(key)
+            await db.delete_webhook(key[1], key[0])
+        else:
+            pool = [w for w in self._hooks.get(key, []) if w.id != webhook_id]
+            if pool:
+                self._hooks[key] = pool
+            else:
+                self.drop(key)
+            self._usage.pop(webhook_id, None)
+            self._pool_caps.pop(key, None)
+            await db.remove_webhook(key[1], key[0], webhook_id)
+        self.stats_counters["evicted"] += 1
+
+    def apply_remote(self, key: Optional[WebhookKey], doc: Optional[Dict[str, Any]]) -> None:
+        """Coherence handler: another instance created or deleted a webhook."""
+        if key is None:
+            return  # can't tell what changed; stale entries are caught on send
+        cached = self._hooks.get(key)
+        if cached is None:
+            return
+        stored = set() if doc is None else {doc.get('webhook_id')} | {m.get('webhook_id') for m in doc.get('pool') or []}
+        if {w.id for w in cached} != stored:
+            self.drop(key)  # reloaded from MongoDB on next use
+
+    def drop_guild(self, guild_id: int) -> None:
+        for key in [k for k in self._hooks if k[0] == guild_id]:
+            self.drop(key)
+        self._validated.pop(guild_id, None)
+
+    # -- Validation -----------------------------------------------------------
+
+    def schedule(self, target: Target, force: bool = False) -> None:
+        """Queue a guild or channel for validation; ``force`` skips the cooldown."""
+        queued = self._queue.get(target.id)
+        self._queue[target.id] = (target, force or (queued is not None and queued[1]))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+
+    async def _work(self) -> None:
+        while self._queue:
+            _, (target, force) = self._queue.popitem(last=False)
+            guild = target if isinstance(target, discord.Guild) else target.guild
+            if not force and time.monotonic() - self._validated.get(target.id, float('-inf')) < self.cooldown:
+                self.stats_counters["skipped"] += 1
+                continue
+            # Proxy sends share the same REST budget; let them go first.
+            for _ in range(10):
+                if not self._busy():
+                    break
+                await asyncio.sleep(self.spacing)
+            try:
+                await self._validate(guild, target)
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    self.stats_counters["validation_rate_limited"] += 1
+                    retry_after = float(getattr(e, "retry_after", 0) or self.spacing * 5)
+                    logger.warning(f"Webhook validation rate limited; pausing {retry_after:.1f}s")
+                    self._queue[target.id] = (target, force)
+                    await asyncio.sleep(retry_after)
+                    continue
+                logger.warning(f"Webhook validation for {target.id} failed: {e}")
+            except Exception:
+                logger.error(f"Webhook validation for {target.id} failed", exc_info=True)
+            await asyncio.sleep(self.spacing)
+
+    async def _validate(self, guild: discord.Guild, target: Target) -> None:
+        if isinstance(target, discord.Guild):
+            keys = [k for k in self._hooks if k[0] == guild.id]
+        else:
+            keys = [k for k in self._hooks if k == (guild.id, target.id)]
+        if not keys:
+            return
+        self._validated[target.id] = time.monotonic()
+        me = guild.me
+        alive = None
+        if me is not None and me.guild_permissions.manage_webhooks:
+            taken = discord.utils.utcnow() - _SNAPSHOT_SLACK
+            alive = {w.id for w in await target.webhooks()}
+            self.stats_counters["validations"] += 1
+        for key in keys:
+            pool = self._hooks.get(key)
+            if not pool:
+                continue
+            channel = guild.get_channel(key[1])
+            if channel is None:
+                await self.evict(key)  # channel deleted
+            elif me is not None and not channel.permissions_for(me).view_channel:
+                self.drop(key)
+            elif alive is not None:
+                # Let an in-progress creation finish first, then spare anything
+                # newer than the snapshot: it can't be in there yet.
+                async with self.lock(key):
+                    for webhook in list(self._hooks.get(key) or []):
+                        if webhook.id not in alive and discord.utils.snowflake_time(webhook.id) < taken:
+                            await self.evict(key, webhook.id)
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(self.revalidate_every)
+            for guild_id in {k[0] for k in self._hooks}:
+                guild = self._get_guild(guild_id) if self._get_guild else None
+                if guild is None:
+                    self.drop_guild(guild_id)
+                else:
+                    self.schedule(guild)
+
+    async def close(self) -> None:
+        tasks = [t for t in (self._worker, self._sweeper) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # -- Rate-limit buckets ---------------------------------------------------
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """aiohttp hook that feeds webhook responses into :meth:`observe`."""
+        async def on_request_end(session, ctx, params):
+            self.observe(str(params.url), params.response.status, params.response.headers)
+
+        config = aiohttp.TraceConfig()
+        config.on_request_end.append(on_request_end)
+        return config
+
+    def observe(self, url: str, status: int, headers: Any) -> None:
+        """Update a webhook's bucket from a response's rate-limit headers."""
+        match = _WEBHOOK_URL.search(url)
+        if not match:
+            return
+        webhook_id = int(match.group(1))
+        if webhook_id not in self._usage:
+            return
+        usage = self._usage[webhook_id]
+        now = time.monotonic()
+        try:
+            if status == 429:
+                usage.rate_limited += 1
+                self.stats_counters["rate_limited"] += 1
+                usage.blocked_until = now + float(headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After") or 1)
+            elif headers.get("X-RateLimit-Remaining") == "0":
+                usage.blocked_until = now + float(headers.get("X-RateLimit-Reset-After") or 0)
+        except ValueError:
+            pass
+
+    def bucket_stats(self) -> Dict[int, Dict[str, int]]:
+        """Per-webhook send and 429 counts, for webhooks that have sent anything."""
+        return {
+            webhook_id: {"sends": u.sends, "rate_limited": u.rate_limited, "in_flight": u.in_flight}
+            for webhook_id, u in self._usage.items() if u.sends or u.rate_limited
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "channels": len(self._hooks),
+            "cached": len(self),
+            "queued": len(self._queue),
+            "pool_size": self.pool_size,
+            **self.stats_counters,
+        }